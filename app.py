@@ -1,206 +1,293 @@
 import streamlit as st
-import requests
 import pandas as pd
-import math
-import random
+import numpy as np
 from streamlit_js_eval import get_geolocation
-from geopy.geocoders import Nominatim
-from datetime import datetime
 import time
 import json
 import os
+from datetime import date, timedelta
+from ebird_engine import (
+    MAX_HOTSPOTS, eBirdEngine, ObservationCache, HotspotCatalog, SharedResultStore, ScanMetrics, CACHE_PATH,
+    SNAPSHOT_DIR, load_snapshot, read_manifest, export_metrics
+)
+from species_catalog import SpeciesCatalog, find_birds_file, species_key
+from gazetteer import Geocoder
+from archive import ObservationArchive, ARCHIVE_PATH, BACKFILL_MAX_REQUESTS, LONG_WINDOWS, backfill_targets
 
 st.set_page_config(page_title="eBird Israel Ultimate Pro", layout="wide")
 
-class eBirdEngine:
-    def __init__(self, api_key):
-        self.api_key = api_key
-        self.headers = {"X-eBirdApiToken": api_key}
-        self.base_url = "https://api.ebird.org/v2"
+LIVE_REFRESH_BATCHES = 10   # רענון התצוגה החיה כל N מוקדים
+VIEW_CACHE_ENTRIES = 16     # גרסאות תוצאה שהתצוגות הנגזרות שלהן נשמרות
 
-    def calculate_distance(self, lat1, lon1, lat2, lon2):
-        R = 6371
-        dlat, dlon = math.radians(lat2-lat1), math.radians(lon2-lon1)
-        a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
-        return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+@st.cache_data(ttl=60, show_spinner=False)
+def locate_birds_file():
+    """איתור קובץ הציפורים - נבדק לכל היותר פעם בדקה"""
+    return find_birds_file()
 
-    def get_hotspots_in_region(self, lat, lon, dist):
-        """שליפת כל ה-hotspots באזור"""
-        try:
-            params = {"lat": lat, "lng": lon, "dist": dist, "fmt": "json"}
-            response = requests.get(
-                f"{self.base_url}/ref/hotspot/geo",
-                headers=self.headers,
-                params=params,
-                timeout=30
-            )
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            st.warning(f"שגיאה בשליפת hotspots: {e}")
-        return []
+@st.cache_resource(show_spinner=False)
+def load_species_catalog(path, mtime):
+    """הקטלוג ואינדקס החיפוש נבנים פעם אחת לכל גרסת קובץ (mtime)"""
+    return SpeciesCatalog.from_file(path)
 
-    def get_species_list_for_location(self, loc_id, days):
-        """שליפת רשימת כל המינים במוקד מסוים"""
-        try:
-            params = {"back": days}
-            response = requests.get(
-                f"{self.base_url}/data/obs/{loc_id}/recent",
-                headers=self.headers,
-                params=params,
-                timeout=15
-            )
-            if response.status_code == 200:
-                return response.json()
-            time.sleep(0.05)  # מניעת חסימה
-        except Exception as e:
-            pass
-        return []
+def get_species_catalog():
+    path = locate_birds_file()
+    mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+    return load_species_catalog(path, mtime)
 
-    def fetch_comprehensive_data_with_hotspots(self, lat, lon, dist, days, progress_bar=None):
-        """גישה חדשה: שליפה לפי hotspots למדויקות מלאה"""
-        
-        # שלב 1: שליפת כל ה-hotspots
-        if progress_bar:
-            progress_bar.progress(0.1, "שולף רשימת מוקדים...")
-        
-        hotspots = self.get_hotspots_in_region(lat, lon, dist)
-        
-        if not hotspots:
-            st.warning("לא נמצאו hotspots באזור - מנסה שיטה חלופית...")
-            return self.fetch_basic_data(lat, lon, dist, days, progress_bar)
-        
-        st.info(f"נמצאו {len(hotspots)} מוקדים - שואב נתונים מכל אחד...")
-        
-        # שלב 2: שליפת נתונים מכל hotspot
-        all_observations = []
-        hotspot_species_count = {}
-        
-        for idx, hotspot in enumerate(hotspots[:150]):  # מגבלה של 150 מוקדים
-            if idx % 10 == 0 and progress_bar:
-                progress = 0.1 + (idx / len(hotspots[:150])) * 0.8
-                progress_bar.progress(progress, f"עיבוד מוקד {idx + 1}/{len(hotspots[:150])}...")
-            
-            loc_id = hotspot['locId']
-            observations = self.get_species_list_for_location(loc_id, days)
-            
-            if observations:
-                # שמירת כמות המינים הייחודיים במוקד
-                unique_species = set(obs['sciName'] for obs in observations if 'sciName' in obs)
-                hotspot_species_count[loc_id] = {
-                    'count': len(unique_species),
-                    'name': hotspot['locName'],
-                    'lat': hotspot['lat'],
-                    'lng': hotspot['lng']
-                }
-                
-                # הוספת המידע על המיקום לכל תצפית
-                for obs in observations:
-                    obs['locName'] = hotspot['locName']
-                    obs['lat'] = hotspot['lat']
-                    obs['lng'] = hotspot['lng']
-                
-                all_observations.extend(observations)
-        
-        if progress_bar:
-            progress_bar.progress(0.95, "ממזג נתונים...")
-        
-        # המרה ל-DataFrame
-        df = pd.DataFrame(all_observations) if all_observations else pd.DataFrame()
-        
-        if not df.empty:
-            df = df.drop_duplicates(subset=['subId', 'sciName', 'howMany'], keep='first')
-        
-        return df, hotspot_species_count
+@st.cache_resource
+def get_observation_cache():
+    """מטמון משותף לכל הסשנים בתהליך"""
+    return ObservationCache(CACHE_PATH)
 
-    def fetch_basic_data(self, lat, lon, dist, days, progress_bar=None):
-        """שיטה בסיסית כגיבוי"""
-        all_data = []
-        
-        base_params = {
-            "lat": lat, "lng": lon, "dist": dist, "back": days,
-            "fmt": "json", "includeProvisional": "true", "maxResults": 10000
-        }
-        
-        endpoints = [
-            f"{self.base_url}/data/obs/geo/recent",
-            f"{self.base_url}/data/obs/geo/recent/notable",
-        ]
-        
-        for idx, url in enumerate(endpoints):
-            try:
-                if progress_bar:
-                    progress_bar.progress((idx + 1) / 3, f"שולף נתונים {idx + 1}/2...")
-                response = requests.get(url, headers=self.headers, params=base_params, timeout=30)
-                if response.status_code == 200:
-                    all_data.extend(response.json())
-            except Exception as e:
-                st.warning(f"שגיאה: {e}")
-        
-        df = pd.DataFrame(all_data) if all_data else pd.DataFrame()
-        if not df.empty:
-            df = df.drop_duplicates(subset=['subId', 'sciName'], keep='first')
-        
-        # חישוב בסיסי של מינים לכל מוקד
-        hotspot_species_count = {}
-        if not df.empty:
-            for loc_id, group in df.groupby('locId'):
-                hotspot_species_count[loc_id] = {
-                    'count': group['sciName'].nunique(),
-                    'name': group.iloc[0]['locName'],
-                    'lat': group.iloc[0]['lat'],
-                    'lng': group.iloc[0]['lng']
-                }
-        
-        return df, hotspot_species_count
-
-def load_birds_data():
-    """טוען את רשימת הציפורות מקובץ birds.json"""
-    
-    # רשימת נתיבים אפשריים
-    possible_paths = [
-        "/mnt/user-data/uploads/birds.json",
-        "./birds.json",
-        "birds.json",
-        "/home/claude/birds.json"
-    ]
-    
-    # ניסיון לטעון מכל נתיב
-    for path in possible_paths:
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    birds_data = json.load(f)
-                    st.sidebar.success(f"✅ קובץ ציפורים נטען מ: {os.path.basename(path)}")
-                    return birds_data
-            except Exception as e:
-                st.sidebar.warning(f"שגיאה בקריאת {path}: {e}")
-    
-    # חיפוש כלי של JSON באזור uploads
-    upload_dir = "/mnt/user-data/uploads"
-    if os.path.exists(upload_dir):
-        all_files = os.listdir(upload_dir)
-        json_files = [f for f in all_files if f.endswith('.json')]
-        
-        if json_files:
-            try:
-                json_path = os.path.join(upload_dir, json_files[0])
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    birds_data = json.load(f)
-                    st.sidebar.success(f"✅ נטען: {json_files[0]}")
-                    return birds_data
-            except Exception as e:
-                st.sidebar.error(f"שגיאה בקריאת JSON: {e}")
-    
-    # רשימה בסיסית כברירת מחדל
-    st.sidebar.error("❌ לא נמצא קובץ birds.json")
-    st.sidebar.info("💡 שים את birds.json באותה תיקייה או העלה אותו")
-    
-    return [
-        {"heb": "דרור הבית", "eng": "House Sparrow", "sci": "Passer domesticus"},
-        {"heb": "בולבול", "eng": "Common Bulbul", "sci": "Pycnonotus barbatus"},
-        {"heb": "עורב מצוי", "eng": "Hooded Crow", "sci": "Corvus cornix"},
-    ]
+@st.cache_resource
+def get_hotspot_catalog():
+    """קטלוג המוקדים הארצי ואינדקס הרשת שלו - נבנה פעם אחת לתהליך"""
+    return HotspotCatalog()
+
+@st.cache_resource
+def get_result_store():
+    """מאגר תוצאות הסריקה המשותף לכל הסשנים בתהליך"""
+    return SharedResultStore()
+
+@st.cache_resource
+def get_metrics_totals():
+    """מדדי כל הסריקות בתהליך - מקור קובץ ה-Prometheus"""
+    return ScanMetrics()
+
+def record_scan_metrics(result):
+    """צירוף מדדי הסריקה לסכומי התהליך וייצוא (אם הוגדרו EBIRD_METRICS_JSONL/PROM)"""
+    if result.metrics is None:
+        return
+    totals = get_metrics_totals()
+    totals.merge(result.metrics)
+    labels = {key: result.params.get(key) for key in ('lat', 'lon', 'radius', 'days', 'strategy', 'partial')}
+    export_metrics(result.metrics, totals, **labels)
+
+@st.cache_resource
+def get_archive():
+    """ארכיון התצפיות המקומי - חיבור אחד לתהליך"""
+    return ObservationArchive(ARCHIVE_PATH)
+
+def archive_scan(result):
+    """כל סריקה מצטרפת לארכיון; כשל בארכיון לא מפיל את הסריקה"""
+    if result.df.empty:
+        return
+    try:
+        get_archive().append(result.df)
+    except Exception as e:
+        st.warning(f"שמירה לארכיון נכשלה: {e}")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_archive_view(lat, lon, radius, window, version):
+    """גרף יומי ודירוג מינים מהארכיון; version (זמן ההוספה האחרונה) מבטל את המטמון"""
+    archive = get_archive()
+    end = date.today()
+    start = end - timedelta(days=window - 1)
+    return archive.daily_counts(lat, lon, radius, start, end), archive.species_ranking(lat, lon, radius, start, end)
+
+@st.cache_resource
+def get_geocoder():
+    """מאגר היישובים נטען פעם אחת; גיאוקוד מקוון נשמר במטמון המתמשך"""
+    return Geocoder(cache=get_observation_cache())
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def geocode_place(name):
+    """לכל שם מתבצע חיפוש אחד לשעה, ולא בכל rerun"""
+    return get_geocoder().resolve(name)
+
+@st.cache_resource
+def load_snapshot_result(path, mtime, meta_json):
+    """תמונת מצב נטענת פעם אחת לכל גרסת קובץ ומשותפת לכל הסשנים"""
+    return load_snapshot(path, json.loads(meta_json))
+
+def streamlit_notify(level, message):
+    """הודעות המנוע מוצגות כהודעות Streamlit"""
+    getattr(st, level)(message)
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES, show_spinner=False)
+def hotspot_view(version, _result):
+    """טבלת עשרת המוקדים העשירים וקישוריהם; מחושבת פעם אחת לכל גרסת תוצאה"""
+    top_10 = _result.hotspot_index.head(10).reset_index()
+    table = pd.DataFrame({
+        'מיקום': top_10['name'],
+        'מספר מינים': top_10['species'],
+        'מרחק (ק"מ)': top_10['distance'].astype(float).round(1),
+        'תאריך אחרון': top_10['latest_obs'].dt.strftime('%Y-%m-%d %H:%M'),
+    })
+    links = "  \n".join(f"• [{name}](https://ebird.org/hotspot/{loc_id})"
+                        for name, loc_id in zip(top_10['name'], top_10['locId']))
+    return table, links
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES, show_spinner=False)
+def species_view(version, _result):
+    """דירוג המינים המלא ומספר המינים השונים"""
+    df = _result.df
+    species_column = "מין (אנגלית)" if 'comName' in df.columns else "מין (מדעי)"
+    ranked_species = _result.species_stats.reset_index()
+    ranked_species.columns = [species_column, "תצפיות", "סה\"כ פרטים"]
+    return ranked_species, int(df['sciName'].nunique())
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES, show_spinner=False)
+def daily_view(version, _result):
+    """מספר התצפיות לכל יום"""
+    obs_dt = _result.df['obsDt']
+    return obs_dt.dt.normalize().value_counts().sort_index().rename("תצפיות")
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES * 4, show_spinner=False)
+def bird_view(version, target_sci, _result):
+    """עשר התצפיות הגדולות של מין (כולל תתי-מינים) ומספר התצפיות שלו.
+    הטבלה מכילה רק עמודות שיש בהן נתונים; None אם אין אף אחת"""
+    # אינדקס sciName → שורות שנבנה בקליטה
+    positions = _result.species_positions.get(species_key(target_sci), [])
+    matches = _result.df.iloc[positions]
+    if matches.empty:
+        return None, 0
+    top_10 = matches.iloc[np.argsort(-matches['count'].fillna(1).to_numpy(dtype=np.int64), kind="stable")[:10]]
+    
+    col_mapping = {
+        'locName': 'מיקום',
+        'count': 'כמות',
+        'distance': 'מרחק (ק"מ)',
+        'obsDt': 'תאריך',
+        'userDisplayName': 'צופה'
+    }
+    available_cols = [col for col in col_mapping if col in top_10.columns and top_10[col].notna().any()]
+    if not available_cols:
+        return None, len(matches)
+    display = top_10[available_cols].rename(columns=col_mapping).reset_index(drop=True)
+    if 'מרחק (ק"מ)' in display.columns:
+        display['מרחק (ק"מ)'] = display['מרחק (ק"מ)'].astype(float).round(1)
+    if 'תאריך' in display.columns:
+        display['תאריך'] = display['תאריך'].dt.strftime('%Y-%m-%d %H:%M')
+    return display, len(matches)
+
+def show_top_hotspots(result):
+    st.header("🏆 המוקדים העשירים ביותר")
+    
+    # קריאה מאינדקס המוקדים - ללא סריקה של התצפיות הגולמיות
+    if result.hotspot_index.empty:
+        st.info("אין נתוני מוקדים זמינים")
+        return
+    display_df, links = hotspot_view(result.version, result)
+    
+    st.write(f"**נבדקו {len(result.hotspot_index)} מוקדים**")
+    st.write("")
+    
+    # טבלה עם לינקים
+    st.dataframe(display_df, use_container_width=True, hide_index=True, height=400)
+    
+    # הצגת קישורים בנפרד
+    st.write("")
+    st.subheader("קישורים למוקדים")
+    st.markdown(links)
+    
+    # גרף
+    st.write("")
+    st.subheader("גרף השוואתי")
+    st.bar_chart(display_df.set_index('מיקום')['מספר מינים'])
+
+@st.fragment
+def species_lookup(result):
+    """חיפוש ובחירת מין מריצים מחדש רק את הקטע הזה, לא את כל הדף"""
+    st.header("🎯 תצפיות שיא לפי מין")
+    
+    catalog = get_species_catalog()
+    bird_query = st.text_input("🔎 חיפוש (עברית / English / שם מדעי):", key="bird_query")
+    selected_bird = st.selectbox(
+        "🔍 בחר ציפור:",
+        [""] + catalog.search(bird_query),
+        key="bird_select"
+    )
+    if not selected_bird:
+        return
+    
+    target_sci = catalog.bird_map.get(selected_bird, "")
+    if not target_sci:
+        st.error("לא נמצא שם מדעי")
+        return
+    display, matches = bird_view(result.version, target_sci, result)
+    if not matches:
+        st.info(f"לא נמצאו תצפיות של {selected_bird}")
+    elif display is None:
+        st.error("לא ניתן להציג נתונים - עמודות חסרות")
+    else:
+        st.write(f"**נמצאו {matches} תצפיות של {selected_bird}**")
+        st.dataframe(display, use_container_width=True, hide_index=True)
+
+@st.fragment
+def archive_trends(lat, lon, radius, species_column):
+    """מגמות מהארכיון; שינוי חלון הזמן מריץ מחדש רק את הקטע הזה"""
+    st.subheader("📚 מגמות לטווח ארוך (ארכיון מקומי)")
+    window = st.selectbox("חלון זמן:", LONG_WINDOWS, format_func=lambda d: f"{d} ימים", key="archive_window")
+    archive_stats = get_archive().stats()
+    if not archive_stats['rows']:
+        st.info("הארכיון עדיין ריק - הוא מתמלא מכל סריקה ומ'מילוי היסטורי' בסרגל הצד")
+        return
+    archive_daily, archive_species = load_archive_view(lat, lon, radius, window, archive_stats['ingested_at'])
+    st.caption(f"ברדיוס {radius} ק\"מ מהמרכז, מתוך {archive_stats['rows']:,} תצפיות בארכיון "
+               f"({archive_stats['first_date']} עד {archive_stats['last_date']}). "
+               f"ימים שמולאו מההיסטוריה כוללים תצפית אחת לכל מין במוקד ביום")
+    if not archive_daily.empty:
+        st.line_chart(archive_daily['observations'])
+    archive_ranking = archive_species.head(10).reset_index()
+    archive_ranking.columns = [species_column, "תצפיות", "סה\"כ פרטים"]
+    st.dataframe(archive_ranking, use_container_width=True, hide_index=True)
+
+def show_statistics(result, lat, lon, radius, days):
+    st.header("📊 סטטיסטיקה כללית")
+    ranked_species, species_count = species_view(result.version, result)
+    
+    # הכפילויות הוסרו כבר בסיום הסריקה והסטטיסטיקה חושבה פעם אחת
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("סה\"כ תצפיות (ייחודיות)", f"{len(result.df):,}")
+    with col2:
+        st.metric("מינים שונים", f"{species_count}")
+    with col3:
+        st.metric("מוקדים", f"{len(result.hotspot_index)}")
+    
+    st.write("")
+    st.info(f"📅 נתונים מ-{result.params.get('days', days)} ימים אחרונים | הוסרו {result.duplicates_removed:,} תצפיות כפולות")
+    
+    st.write("")
+    st.subheader("🦅 10 המינים הנצפים ביותר")
+    
+    # טבלה
+    species_table = ranked_species.head(10)
+    st.dataframe(
+        species_table,
+        use_container_width=True,
+        hide_index=True,
+        height=400
+    )
+    
+    with st.expander(f"📋 דירוג מלא - {len(ranked_species)} מינים"):
+        st.dataframe(ranked_species, use_container_width=True, hide_index=True)
+    
+    # גרף עמודות - לפי מספר תצפיות
+    st.write("")
+    st.subheader("📊 גרף: מספר תצפיות לפי מין")
+    chart_data = species_table.set_index(species_table.columns[0])['תצפיות']
+    st.bar_chart(chart_data)
+    
+    # גרף נוסף - לפי סה"כ פרטים
+    st.write("")
+    st.subheader("📊 גרף: סה\"כ פרטים לפי מין")
+    chart_data2 = species_table.set_index(species_table.columns[0])['סה\"כ פרטים']
+    st.bar_chart(chart_data2)
+    
+    st.write("")
+    st.subheader("📅 תצפיות לפי תאריך")
+    daily_counts = daily_view(result.version, result)
+    if not daily_counts.empty:
+        st.line_chart(daily_counts)
+    else:
+        st.info("לא ניתן להציג גרף תאריכים")
+    
+    st.write("")
+    archive_trends(result.params.get('lat', lat), result.params.get('lon', lon),
+                   result.params.get('radius', radius), species_column=ranked_species.columns[0])
 
 # ===================== UI =====================
 
@@ -222,16 +309,56 @@ with st.sidebar:
     elif mode == "עיר":
         city = st.text_input("שם עיר:", "Kfar Saba")
         try:
-            geo = Nominatim(user_agent=f"ebird_{random.randint(1,9999)}").geocode(f"{city}, Israel")
-            if geo: 
-                clat, clon = geo.latitude, geo.longitude
-                st.success(f"📍 {city}")
+            place = geocode_place(city)
+            if place:
+                clat, clon = place['lat'], place['lon']
+                st.success(f"📍 {place['name']}")
+            else:
+                st.warning(f"לא נמצא מקום בשם '{city}' - החיפוש ממורכז בכפר סבא")
         except Exception as e:
             st.error(f"שגיאה: {e}")
     
     st.subheader("🔍 פרמטרים")
     radius = st.slider("רדיוס (ק\"מ):", 1, 50, 50)
-    days = st.slider("ימים אחורה:", 1, 30, 14)
+    days = st.slider("ימים אחורה:", 1, 30, 14,
+                     help="מגבלת ה-API היא 30 יום. לטווח ארוך - ראו 'מגמות לטווח ארוך' בלשונית הסטטיסטיקה")
+    
+    with st.expander("⏱️ תקציב סריקה"):
+        max_requests = st.slider("מקסימום מוקדים (בקשות):", 10, 500, MAX_HOTSPOTS, step=10)
+        time_budget = st.number_input("מגבלת זמן (שניות, 0 = ללא):", 0, 600, 0, step=10)
+        st.caption("המוקדים נסרקים לפי סדר עדיפות: פעילות אחרונה, עושר מינים וקרבה")
+        strategy_labels = {"hotspots": "מדויקת - בקשה לכל מוקד", "tiles": "חסכונית - אריחים אזוריים"}
+        strategy = st.radio("שיטת שליפה:", list(strategy_labels), format_func=strategy_labels.get)
+        if strategy == "tiles":
+            st.caption("ⓘ באריח עם כמה מוקדים, eBird מחזיר רק את התצפית האחרונה לכל מין - "
+                       "ספירת המינים למוקד היא הערכה חסרה")
+    
+    show_diagnostics = st.checkbox("🩺 הצג אבחון סריקה (זמנים, בקשות ומטמון)")
+    
+    with st.expander("📚 ארכיון תצפיות"):
+        archive_stats = get_archive().stats()
+        if archive_stats['rows']:
+            st.caption(f"{archive_stats['rows']:,} תצפיות, {archive_stats['first_date']} עד {archive_stats['last_date']}")
+        else:
+            st.caption("הארכיון ריק - כל סריקה נשמרת בו אוטומטית")
+        st.caption("⏪ מילוי היסטורי: כל מוקד ברדיוס שנבחר, בקשה לכל מוקד ויום. eBird מחזיר לכל "
+                   "מוקד ויום רק את התצפית האחרונה של כל מין - ספירות הפרטים בימים אלה הן הערכת חסר")
+        backfill_days = st.number_input("ימים אחורה:", 1, 730, 90)
+        backfill_budget = st.slider("מקסימום בקשות:", 10, 1000, BACKFILL_MAX_REQUESTS, step=10)
+        backfill_clicked = st.button("⏪ מילוי היסטורי", use_container_width=True, disabled=not api_key)
+    
+    snapshots = read_manifest(SNAPSHOT_DIR)
+    if snapshots:
+        st.subheader("📦 תמונות מצב מוכנות")
+        snapshot_names = [f"{entry['name']} ({entry['scanned_at'][:10]})" for entry in snapshots]
+        chosen = st.selectbox("אזור מחושב מראש:", [""] + snapshot_names)
+        if chosen and st.button("📂 טען תמונת מצב", use_container_width=True):
+            entry = snapshots[snapshot_names.index(chosen)]
+            path = os.path.join(SNAPSHOT_DIR, entry['file'])
+            st.session_state['scan_result'] = load_snapshot_result(
+                path, os.path.getmtime(path), json.dumps(entry, sort_keys=True)
+            )
+            st.session_state['scan_errors'] = entry.get('errors', [])
     
     st.divider()
     st.caption("birds.json: רשימת ציפורות בפורמט [{'heb':'...','eng':'...','sci':'...'}]")
@@ -239,35 +366,77 @@ with st.sidebar:
 if not api_key:
     st.warning("⚠️ הזן API Key מ-eBird")
     st.info("📝 קבל מפתח חינם: https://ebird.org/api/keygen")
-    st.stop()
+    if 'scan_result' not in st.session_state:
+        st.stop()
 
-engine = eBirdEngine(api_key)
+engine = eBirdEngine(
+    api_key, cache=get_observation_cache(), catalog=get_hotspot_catalog(), notify=streamlit_notify
+)
 
-if st.button("🚀 סריקה מלאה (כל המוקדים)", type="primary", use_container_width=True):
+if backfill_clicked:
+    backfill_hotspots = backfill_targets(engine, clat, clon, radius)
+    if not backfill_hotspots:
+        st.warning("לא נמצאו מוקדים ברדיוס למילוי היסטורי")
+    else:
+        backfill_progress = st.progress(0, f"ממלא את הארכיון מ-{len(backfill_hotspots)} מוקדים...")
+        end = date.today() - timedelta(days=1)
+        summary = get_archive().backfill(
+            engine, backfill_hotspots, end - timedelta(days=int(backfill_days) - 1), end,
+            max_requests=backfill_budget, progress=backfill_progress.progress
+        )
+        backfill_progress.empty()
+        st.success(f"📚 {summary['requests']} בקשות, {summary['added']:,} תצפיות חדשות בארכיון")
+        if summary['errors']:
+            st.warning(f"⚠️ {len(summary['errors'])} בקשות (מוקד ויום) נכשלו - ינוסו שוב במילוי הבא")
+
+if st.button("🚀 סריקה מלאה (כל המוקדים)", type="primary", use_container_width=True, disabled=not api_key):
     progress_bar = st.progress(0, "מתחיל...")
+    # כל לחיצה עוצרת את הריצה הנוכחית; מה שהגיע עד כה נשמר ב-scan_partial
+    st.button("⏹️ עצור סריקה (שמור את מה שהגיע)")
+    live = st.empty()
+    
+    def show_live(accumulator):
+        """עדכון חי של הדירוגים תוך כדי סריקה"""
+        st.session_state['scan_partial'] = (accumulator, engine)
+        if accumulator.batches % LIVE_REFRESH_BATCHES:
+            return
+        with live.container():
+            col1, col2 = st.columns(2)
+            with col1:
+                st.caption(f"🏆 מוקדים מובילים עד כה ({accumulator.batches} נסרקו)")
+                top_hotspots = accumulator.top_hotspots()
+                top_hotspots.columns = ['מיקום', 'מינים', 'תאריך אחרון'][:len(top_hotspots.columns)]
+                st.dataframe(top_hotspots, use_container_width=True, hide_index=True)
+            with col2:
+                st.caption(f"🦅 מינים נפוצים עד כה ({len(accumulator.species)} מינים)")
+                top_species = accumulator.top_species()
+                top_species.columns = ['מין', 'תצפיות']
+                st.dataframe(top_species, use_container_width=True, hide_index=True)
     
-    with st.spinner("סורק את כל המוקדים באזור..."):
-        df, hotspot_counts = engine.fetch_comprehensive_data_with_hotspots(
-            clat, clon, radius, days, progress_bar
+    store = get_result_store()
+    scan_key = store.make_key(clat, clon, radius, days, max_requests, time_budget, strategy)
+    spinner_text = {
+        "cached": "משתמש בתוצאת סריקה עדכנית של אותו אזור...",
+        "inflight": "סריקה זהה כבר רצה - ממתין לתוצאה המשותפת...",
+    }.get(store.status(scan_key), "סורק את כל המוקדים באזור...")
+    
+    def run_scan():
+        scan_result = engine.scan(
+            clat, clon, radius, days, progress_bar.progress, show_live,
+            max_requests=max_requests, time_budget=time_budget or None, strategy=strategy
         )
-        
-        if not df.empty:
-            df['distance'] = df.apply(
-                lambda x: engine.calculate_distance(clat, clon, x['lat'], x['lng']),
-                axis=1
-            )
-            
-            # ספירת כפילויות לפני ההסרה
-            original_count = len(df)
-            
-            # הסרת כפילויות: אותו מין, מקום ותאריך-שעה = תצפית אחת
-            df = df.drop_duplicates(subset=['sciName', 'locId', 'obsDt'], keep='first')
-            
-            duplicates_removed = original_count - len(df)
-            
-            st.session_state['master_df'] = df
-            st.session_state['hotspot_counts'] = hotspot_counts
-            st.session_state['duplicates_removed'] = duplicates_removed
+        record_scan_metrics(scan_result)
+        archive_scan(scan_result)
+        return scan_result
+    
+    with st.spinner(spinner_text):
+        result = store.get_or_compute(scan_key, run_scan)
+        st.session_state.pop('scan_partial', None)
+        st.session_state['scan_errors'] = result.errors
+        live.empty()
+        
+        if not result.df.empty:
+            st.session_state['scan_result'] = result
             
             progress_bar.progress(1.0, "✅ הושלם!")
             time.sleep(0.3)
@@ -275,219 +444,96 @@ if st.button("🚀 סריקה מלאה (כל המוקדים)", type="primary", u
             
             st.success(f"""
             ✅ **הסריקה הושלמה!**
-            - 📊 {len(df):,} תצפיות ייחודיות
-            - 🗑️ הוסרו {duplicates_removed:,} כפילויות
-            - 📍 {df['locId'].nunique()} מוקדים  
-            - 🦅 {df['sciName'].nunique()} מינים שונים
+            - 📊 {len(result.df):,} תצפיות ייחודיות
+            - 🗑️ הוסרו {result.duplicates_removed:,} כפילויות
+            - 📍 {len(result.hotspot_index)} מוקדים  
+            - 🦅 {result.df['sciName'].nunique()} מינים שונים
             """)
         else:
             st.error("❌ לא נמצאו נתונים")
             progress_bar.empty()
 
-if 'master_df' in st.session_state:
-    df = st.session_state['master_df']
-    hotspot_counts = st.session_state.get('hotspot_counts', {})
+# סריקה שבוטלה באמצע - שומרים את מה שהגיע עד כה
+if 'scan_partial' in st.session_state:
+    accumulator, scan_engine = st.session_state.pop('scan_partial')
+    if accumulator.row_count:
+        st.session_state['scan_result'] = accumulator.to_result(
+            scan_engine.scan_errors, partial=True, coverage=scan_engine.scan_coverage, metrics=scan_engine.metrics
+        )
+        record_scan_metrics(st.session_state['scan_result'])
+        archive_scan(st.session_state['scan_result'])
+        st.session_state['scan_errors'] = list(scan_engine.scan_errors)
+
+# דוח שגיאות הסריקה האחרונה - מוקדים שנכשלו לא נעלמים בשקט
+scan_errors = st.session_state.get('scan_errors', [])
+if scan_errors:
+    with st.expander(f"⚠️ {len(scan_errors)} בקשות נכשלו בסריקה האחרונה - הנתונים חלקיים"):
+        errors_df = pd.DataFrame(scan_errors)
+        errors_df.columns = ['מזהה מוקד', 'מיקום', 'שגיאה']
+        st.dataframe(errors_df, use_container_width=True, hide_index=True)
+
+if 'scan_result' in st.session_state:
+    result = st.session_state['scan_result']
+    
+    if result.params.get('partial'):
+        st.warning(f"⏹️ הסריקה בוטלה - מוצגות תוצאות חלקיות מ-{len(result.hotspot_index)} מוקדים")
+    
+    coverage = result.params.get('coverage')
+    if coverage:
+        st.caption(
+            f"📡 כיסוי: נסרקו {coverage['hotspots_fetched']} מתוך {coverage['hotspots_total']} מוקדים באזור "
+            f"({coverage['active_fetched']}/{coverage['hotspots_active']} מהמוקדים הפעילים, "
+            f"{coverage['activity_covered']:.0%} מהפעילות)"
+        )
+    
+    if show_diagnostics:
+        with st.expander("🩺 אבחון הסריקה", expanded=True):
+            if result.metrics is None:
+                st.info("אין מדדים לתוצאה זו (תמונת מצב או סריקה ממאגר משותף ישן)")
+            else:
+                summary = result.metrics.summary()
+                cache_ratios = summary['cache']
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("בקשות", summary['requests'], f"{summary['retries']} ניסיונות חוזרים", delta_color="off")
+                col2.metric("זמן בקשה p95", f"{summary['latency_p95'] or 0:.2f} ש'")
+                col3.metric("המתנה למגביל הקצב", f"{summary['queued_seconds']:.1f} ש'",
+                            f"backoff {summary['backoff_seconds']:.1f} ש'", delta_color="off")
+                col4.metric("פגיעות מטמון (תצפיות)",
+                            f"{cache_ratios['observations']['hit_ratio']:.0%}" if 'observations' in cache_ratios else "-")
+                
+                st.caption("⏱️ משך כל שלב (שניות)")
+                st.bar_chart(pd.Series(summary['stages'], name="שניות"))
+                
+                st.caption("🌐 בקשות לפי endpoint")
+                st.dataframe(result.metrics.endpoint_table(), use_container_width=True)
+                st.caption(f"סטטוסים: {summary['statuses']} | מטמון: {cache_ratios}")
+                
+                col1, col2 = st.columns(2)
+                col1.download_button("⬇️ JSONL (סריקה זו)", result.metrics.to_jsonl(**result.params),
+                                     file_name="scan_metrics.jsonl", mime="application/jsonl")
+                col2.download_button("⬇️ Prometheus (כל הסריקות)", get_metrics_totals().to_prometheus(),
+                                     file_name="ebird_metrics.prom", mime="text/plain")
+    
+    catalog = get_species_catalog()
+    if catalog.error:
+        st.sidebar.error(catalog.error)
+        st.sidebar.info("💡 שים את birds.json באותה תיקייה או העלה אותו")
+    else:
+        st.sidebar.success(f"✅ קובץ ציפורים נטען מ: {os.path.basename(catalog.source)}")
     
+    # רק הלשונית הפתוחה מחושבת; התצוגות הנגזרות נשמרות לפי result.version
     tab1, tab2, tab3 = st.tabs([
         "🏆 10 מוקדים עשירים", 
         "🎯 תצפיות שיא למין",
         "📊 סטטיסטיקה"
-    ])
+    ], key="result_tab", on_change="rerun")
 
     with tab1:
-        st.header("🏆 המוקדים העשירים ביותר")
-        
-        # שימוש בנתונים המדויקים מה-hotspot counts
-        location_data = []
-        
-        for loc_id, data in hotspot_counts.items():
-            distance = engine.calculate_distance(clat, clon, data['lat'], data['lng'])
-            
-            # מציאת התצפית האחרונה במוקד זה
-            loc_obs = df[df['locId'] == loc_id]
-            latest_date = ""
-            if not loc_obs.empty and 'obsDt' in loc_obs.columns:
-                latest_date = str(loc_obs['obsDt'].max())
-            
-            # יצירת לינק ל-eBird
-            ebird_link = f"https://ebird.org/hotspot/{loc_id}"
-            
-            location_data.append({
-                "מיקום": str(data['name']),
-                "מינים": int(data['count']),
-                "מרחק_קמ": round(distance, 1),
-                "תאריך": latest_date,
-                "קישור": ebird_link,
-                "locId": loc_id
-            })
-        
-        if location_data:
-            locations_df = pd.DataFrame(location_data)
-            top_10 = locations_df.sort_values("מינים", ascending=False).head(10)
-            
-            st.write(f"**נבדקו {len(locations_df)} מוקדים**")
-            st.write("")
-            
-            # טבלה עם לינקים
-            display_df = top_10[['מיקום', 'מינים', 'מרחק_קמ', 'תאריך']].copy()
-            display_df.columns = ['מיקום', 'מספר מינים', 'מרחק (ק"מ)', 'תאריך אחרון']
-            
-            st.dataframe(
-                display_df.reset_index(drop=True),
-                use_container_width=True,
-                hide_index=True,
-                height=400
-            )
-            
-            # הצגת קישורים בנפרד
-            st.write("")
-            st.subheader("קישורים למוקדים")
-            for idx, row in top_10.iterrows():
-                st.markdown(f"• [{row['מיקום']}]({row['קישור']})")
-            
-            # גרף
-            st.write("")
-            st.subheader("גרף השוואתי")
-            chart_data = top_10.set_index('מיקום')['מינים']
-            st.bar_chart(chart_data)
-        else:
-            st.info("אין נתוני מוקדים זמינים")
-
+        if tab1.open:
+            show_top_hotspots(result)
     with tab2:
-        st.header("🎯 תצפיות שיא לפי מין")
-        
-        birds_list = load_birds_data()
-        
-        # יצירת מפת ציפורות
-        bird_map = {}
-        for bird in birds_list:
-            key = f"{bird.get('heb', 'Unknown')} ({bird.get('eng', 'Unknown')})"
-            bird_map[key] = bird.get('sci', '')
-        
-        selected_bird = st.selectbox(
-            "🔍 בחר ציפור:",
-            [""] + sorted(list(bird_map.keys())),
-            key="bird_select"
-        )
-        
-        if selected_bird:
-            target_sci = bird_map.get(selected_bird, "")
-            
-            if not target_sci:
-                st.error("לא נמצא שם מדעי")
-            else:
-                matches = df[df['sciName'].str.contains(target_sci, case=False, na=False, regex=False)].copy()
-                
-                if not matches.empty:
-                    matches['sort_qty'] = pd.to_numeric(matches['howMany'], errors='coerce').fillna(1).astype(int)
-                    top_10 = matches.sort_values("sort_qty", ascending=False).head(10)
-                    
-                    # בדיקה אילו עמודות קיימות
-                    available_cols = []
-                    col_mapping = {
-                        'locName': 'מיקום',
-                        'howMany': 'כמות',
-                        'distance': 'מרחק (ק"מ)',
-                        'obsDt': 'תאריך',
-                        'userDisplayName': 'צופה'
-                    }
-                    
-                    for col, name in col_mapping.items():
-                        if col in top_10.columns:
-                            available_cols.append(col)
-                    
-                    if available_cols:
-                        display = top_10[available_cols].copy()
-                        display.columns = [col_mapping[col] for col in available_cols]
-                        
-                        if 'מרחק (ק"מ)' in display.columns:
-                            display['מרחק (ק"מ)'] = display['מרחק (ק"מ)'].round(1)
-                        
-                        st.write(f"**נמצאו {len(matches)} תצפיות של {selected_bird}**")
-                        st.dataframe(display.reset_index(drop=True), use_container_width=True, hide_index=True)
-                    else:
-                        st.error("לא ניתן להציג נתונים - עמודות חסרות")
-                else:
-                    st.info(f"לא נמצאו תצפיות של {selected_bird}")
-
+        if tab2.open:
+            species_lookup(result)
     with tab3:
-        st.header("📊 סטטיסטיקה כללית")
-        
-        # הסרת כפילויות - תצפית אחת לכל שילוב של: מין, מקום, תאריך-שעה
-        df_unique = df.drop_duplicates(subset=['sciName', 'locId', 'obsDt'], keep='first').copy()
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric("סה\"כ תצפיות (ייחודיות)", f"{len(df_unique):,}")
-        with col2:
-            st.metric("מינים שונים", f"{df_unique['sciName'].nunique()}")
-        with col3:
-            st.metric("מוקדים", f"{df_unique['locId'].nunique()}")
-        
-        st.write("")
-        st.info(f"📅 נתונים מ-{days} ימים אחרונים | הוסרו {len(df) - len(df_unique):,} תצפיות כפולות")
-        
-        st.write("")
-        st.subheader("🦅 10 המינים הנצפים ביותר")
-        
-        # ספירת תצפיות ייחודיות לכל מין
-        species_observation_counts = df_unique['comName'].value_counts() if 'comName' in df_unique.columns else df_unique['sciName'].value_counts()
-        top_10_species = species_observation_counts.head(10)
-        
-        # חישוב סה"כ פרטים עבור כל מין
-        species_details = []
-        for species_name in top_10_species.index:
-            if 'comName' in df_unique.columns:
-                species_df = df_unique[df_unique['comName'] == species_name]
-            else:
-                species_df = df_unique[df_unique['sciName'] == species_name]
-            
-            total_individuals = 0
-            
-            # חישוב סכום הפרטים
-            for qty in species_df['howMany']:
-                try:
-                    if pd.notna(qty) and str(qty).strip() != '' and str(qty).upper() != 'X':
-                        total_individuals += int(float(qty))
-                    else:
-                        total_individuals += 1  # X או ריק = לפחות 1
-                except:
-                    total_individuals += 1
-            
-            species_details.append({
-                "מין (אנגלית)" if 'comName' in df_unique.columns else "מין (מדעי)": species_name,
-                "תצפיות": len(species_df),
-                "סה\"כ פרטים": total_individuals
-            })
-        
-        # טבלה
-        species_table = pd.DataFrame(species_details)
-        st.dataframe(
-            species_table,
-            use_container_width=True,
-            hide_index=True,
-            height=400
-        )
-        
-        # גרף עמודות - לפי מספר תצפיות
-        st.write("")
-        st.subheader("📊 גרף: מספר תצפיות לפי מין")
-        chart_data = species_table.set_index(species_table.columns[0])['תצפיות']
-        st.bar_chart(chart_data)
-        
-        # גרף נוסף - לפי סה"כ פרטים
-        st.write("")
-        st.subheader("📊 גרף: סה\"כ פרטים לפי מין")
-        chart_data2 = species_table.set_index(species_table.columns[0])['סה\"כ פרטים']
-        st.bar_chart(chart_data2)
-        
-        st.write("")
-        st.subheader("📅 תצפיות לפי תאריך")
-        if 'obsDt' in df_unique.columns:
-            try:
-                df_unique['date'] = pd.to_datetime(df_unique['obsDt']).dt.date
-                daily_counts = df_unique.groupby('date').size().sort_index()
-                st.line_chart(daily_counts)
-            except Exception as e:
-                st.info("לא ניתן להציג גרף תאריכים")
+        if tab3.open:
+            show_statistics(result, clat, clon, radius, days)
@@ -0,0 +1,365 @@
+"""ארכיון תצפיות מקומי לאורך זמן - מעבר למגבלת 30 הימים של ה-API (ללא תלות ב-Streamlit)
+
+כל סריקה מצטרפת לארכיון (append-only, ללא כפילויות לפי obsKey), ואפשר למלא אותו
+אחורה מה-endpoint ההיסטורי של eBird, מוקד-מוקד ברדיוס. התצפיות מחולקות לפי תא אזורי
+ותאריך, ולצידן נשמרים סיכומים יומיים למין ולמוקד - כך שגרפים ודירוגים של חודשים ושנים
+הם שאילתה מהירה.
+
+מגבלה: ה-endpoint ההיסטורי מחזיר לכל מוקד ויום רק את התצפית האחרונה של כל מין, ולא כל
+רשימה. לכן ימים ממולאים מייצגים נוכחות מינים במוקדים, וספירות הפרטים בהם הן הערכת חסר.
+
+שימוש:
+    python archive.py stats
+    python archive.py backfill --api-key KEY --lat 32.175 --lon 34.906 --radius 15 --days 90
+"""
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from ebird_engine import (
+    eBirdEngine, ObservationCache, HotspotCatalog, CACHE_PATH, haversine, normalize_observations
+)
+
+logger = logging.getLogger("archive")
+
+ARCHIVE_PATH = os.environ.get("EBIRD_ARCHIVE_PATH", "ebird_archive.sqlite")
+ARCHIVE_CELL_DEG = 0.1                 # גודל תא החלוקה האזורית (מעלות, ~10 ק"מ)
+BACKFILL_MAX_REQUESTS = 200            # תקציב בקשות ברירת מחדל למילוי היסטורי
+LONG_WINDOWS = (90, 180, 365, 730)     # חלונות הזמן שמוצעים ב-UI
+
+def cell_of(lat, lng, cell_deg=ARCHIVE_CELL_DEG):
+    """מפתח התא האזורי של נקודה (או מערכים של נקודות)"""
+    rows = np.floor(np.asarray(lat, dtype=float) / cell_deg).astype(int)
+    cols = np.floor(np.asarray(lng, dtype=float) / cell_deg).astype(int)
+    if rows.ndim == 0:
+        return f"{rows}:{cols}"
+    return [f"{r}:{c}" for r, c in zip(rows, cols)]
+
+def cells_in_radius(lat, lon, radius, cell_deg=ARCHIVE_CELL_DEG):
+    """התאים שחותכים את העיגול: (תאים שכולם בפנים, תאים על השפה)"""
+    dlat = radius / 111.0
+    dlon = radius / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    inside, boundary = [], []
+    for row in range(math.floor((lat - dlat) / cell_deg), math.floor((lat + dlat) / cell_deg) + 1):
+        for col in range(math.floor((lon - dlon) / cell_deg), math.floor((lon + dlon) / cell_deg) + 1):
+            lat0, lon0 = row * cell_deg, col * cell_deg
+            corners = haversine(lat, lon, np.array([lat0, lat0, lat0 + cell_deg, lat0 + cell_deg]),
+                                np.array([lon0, lon0 + cell_deg, lon0, lon0 + cell_deg]))
+            nearest = haversine(lat, lon, min(max(lat, lat0), lat0 + cell_deg), min(max(lon, lon0), lon0 + cell_deg))
+            if corners.max() <= radius:
+                inside.append(f"{row}:{col}")
+            elif nearest <= radius:
+                boundary.append(f"{row}:{col}")
+    return inside, boundary
+
+def backfill_targets(engine, lat, lon, radius):
+    """המוקדים ברדיוס למילוי היסטורי (מקטלוג המוקדים אם הוא זמין), מהעשיר לדל"""
+    hotspots = engine.get_hotspots_in_region(lat, lon, radius)
+    return sorted(hotspots, key=lambda h: h.get('numSpeciesAllTime') or 0, reverse=True)
+
+def _observed_since(hotspot, day):
+    """False אם התצפית האחרונה במוקד קודמת ליום - אין מה לשלוף"""
+    latest = str(hotspot.get('latestObsDt') or "")[:10]
+    return not latest or latest >= str(day)
+
+def _placeholders(values):
+    return ",".join("?" * len(values))
+
+class ObservationArchive:
+    """ארכיון SQLite: observations מחולק לפי (region, obs_date), וסיכומים יומיים
+    daily_species (לתא ויום) ו-daily_hotspot (למוקד ויום) שמתעדכנים עם כל הוספה"""
+    def __init__(self, path=ARCHIVE_PATH, cell_deg=ARCHIVE_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS observations (
+                region TEXT NOT NULL,
+                obs_date TEXT NOT NULL,
+                obs_key INTEGER NOT NULL,
+                obs_dt TEXT,
+                loc_id TEXT,
+                loc_name TEXT,
+                lat REAL,
+                lng REAL,
+                sci_name TEXT,
+                com_name TEXT,
+                species_code TEXT,
+                sub_id TEXT,
+                count INTEGER,
+                source TEXT,
+                ingested_at REAL,
+                PRIMARY KEY (region, obs_date, obs_key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS observations_by_location ON observations (obs_date, loc_id);
+            CREATE TABLE IF NOT EXISTS daily_species (
+                region TEXT NOT NULL,
+                obs_date TEXT NOT NULL,
+                sci_name TEXT NOT NULL,
+                com_name TEXT,
+                observations INTEGER NOT NULL,
+                individuals INTEGER NOT NULL,
+                PRIMARY KEY (region, obs_date, sci_name)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS daily_hotspot (
+                obs_date TEXT NOT NULL,
+                loc_id TEXT NOT NULL,
+                region TEXT,
+                loc_name TEXT,
+                lat REAL,
+                lng REAL,
+                observations INTEGER NOT NULL,
+                species INTEGER NOT NULL,
+                individuals INTEGER NOT NULL,
+                PRIMARY KEY (obs_date, loc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS daily_hotspot_by_position ON daily_hotspot (lat, lng);
+            CREATE TABLE IF NOT EXISTS backfill_log (
+                code TEXT NOT NULL,
+                obs_date TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (code, obs_date)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS archive_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                rows INTEGER NOT NULL,
+                first_date TEXT,
+                last_date TEXT,
+                ingested_at REAL,
+                backfilled INTEGER NOT NULL
+            );
+        """)
+        # סיכום הארכיון נשמר בשורה אחת ומתעדכן בכל הוספה; ארכיון קיים מחושב פעם אחת
+        self.conn.execute("""
+            INSERT OR IGNORE INTO archive_meta
+            SELECT 1, COUNT(*), MIN(obs_date), MAX(obs_date), MAX(ingested_at),
+                   (SELECT COUNT(*) FROM backfill_log)
+            FROM observations
+        """)
+        self.conn.commit()
+
+    def append(self, df, source="recent"):
+        """הוספת תצפיות מנורמלות (OBSERVATION_SCHEMA). קיימות מדולגות; מחזיר כמה נוספו"""
+        df = df[df['obsDt'].notna() & df['lat'].notna() & df['lng'].notna()]
+        if df.empty:
+            return 0
+        # obsKey הוא uint64 - נשמר כ-int64 באותם ביטים (SQLite INTEGER הוא signed)
+        keys = df['obsKey'].to_numpy(dtype=np.uint64).view(np.int64)
+        records = list(zip(
+            cell_of(df['lat'].to_numpy(), df['lng'].to_numpy(), self.cell_deg),
+            df['obsDt'].dt.strftime("%Y-%m-%d"),
+            keys.tolist(),
+            df['obsDt'].dt.strftime("%Y-%m-%d %H:%M"),
+            df['locId'].astype(str),
+            df['locName'].astype(object).where(df['locName'].notna(), None),
+            df['lat'].astype(float).round(5),
+            df['lng'].astype(float).round(5),
+            df['sciName'].astype(str),
+            df['comName'].astype(object).where(df['comName'].notna(), None),
+            df['speciesCode'].astype(object).where(df['speciesCode'].notna(), None),
+            df['subId'].astype(object).where(df['subId'].notna(), None),
+            df['count'].astype(object).where(df['count'].notna(), None),
+            repeat(source),
+            repeat(time.time()),
+        ))
+        with self.lock:
+            conn = self.conn
+            conn.execute("DROP TABLE IF EXISTS temp.staging")
+            conn.execute("CREATE TEMP TABLE staging AS SELECT * FROM observations WHERE 0")
+            conn.executemany(f"INSERT INTO staging VALUES ({_placeholders(records[0])})", records)
+            # רק מה שעוד לא בארכיון (וללא כפילויות בתוך האצווה) נשאר ב-staging
+            conn.execute("""
+                DELETE FROM staging WHERE rowid NOT IN (
+                    SELECT MIN(rowid) FROM staging GROUP BY region, obs_date, obs_key
+                ) OR EXISTS (
+                    SELECT 1 FROM observations o
+                    WHERE o.region = staging.region AND o.obs_date = staging.obs_date AND o.obs_key = staging.obs_key
+                )
+            """)
+            added = conn.execute("SELECT COUNT(*) FROM staging").fetchone()[0]
+            if added:
+                conn.execute("INSERT INTO observations SELECT * FROM staging")
+                self._refresh_rollups()
+                first, last = conn.execute("SELECT MIN(obs_date), MAX(obs_date) FROM staging").fetchone()
+                conn.execute("""
+                    UPDATE archive_meta SET rows = rows + ?,
+                        first_date = MIN(COALESCE(first_date, ?), ?),
+                        last_date = MAX(COALESCE(last_date, ?), ?),
+                        ingested_at = ?
+                """, (added, first, first, last, last, time.time()))
+            conn.execute("DROP TABLE temp.staging")
+            conn.commit()
+        return added
+
+    def _refresh_rollups(self):
+        """חישוב מחדש של הסיכומים היומיים רק למחיצות שקיבלו שורות חדשות (staging)"""
+        conn = self.conn
+        conn.execute("""
+            DELETE FROM daily_species WHERE (region, obs_date) IN (SELECT DISTINCT region, obs_date FROM staging)
+        """)
+        conn.execute("""
+            INSERT INTO daily_species
+            SELECT o.region, o.obs_date, o.sci_name, MAX(o.com_name), COUNT(*), SUM(COALESCE(o.count, 1))
+            FROM observations o
+            JOIN (SELECT DISTINCT region, obs_date FROM staging) p ON o.region = p.region AND o.obs_date = p.obs_date
+            GROUP BY o.region, o.obs_date, o.sci_name
+        """)
+        conn.execute("""
+            DELETE FROM daily_hotspot WHERE (obs_date, loc_id) IN (SELECT DISTINCT obs_date, loc_id FROM staging)
+        """)
+        conn.execute("""
+            INSERT INTO daily_hotspot
+            SELECT o.obs_date, o.loc_id, MAX(o.region), MAX(o.loc_name), AVG(o.lat), AVG(o.lng),
+                   COUNT(*), COUNT(DISTINCT o.sci_name), SUM(COALESCE(o.count, 1))
+            FROM observations o
+            JOIN (SELECT DISTINCT obs_date, loc_id FROM staging) p ON o.obs_date = p.obs_date AND o.loc_id = p.loc_id
+            GROUP BY o.obs_date, o.loc_id
+        """)
+
+    def _query(self, sql, params):
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def daily_counts(self, lat, lon, radius, start, end):
+        """תצפיות לכל יום ברדיוס, מתוך הסיכום היומי של המוקדים"""
+        dlat = radius / 111.0
+        dlon = radius / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        rows = self._query("""
+            SELECT obs_date, lat, lng, observations, individuals FROM daily_hotspot
+            WHERE lat BETWEEN ? AND ? AND lng BETWEEN ? AND ? AND obs_date BETWEEN ? AND ?
+        """, (lat - dlat, lat + dlat, lon - dlon, lon + dlon, str(start), str(end)))
+        rows = rows[haversine(lat, lon, rows['lat'].to_numpy(), rows['lng'].to_numpy()) <= radius]
+        daily = rows.groupby('obs_date')[['observations', 'individuals']].sum()
+        daily.index = pd.to_datetime(daily.index)
+        return daily.sort_index()
+
+    def species_ranking(self, lat, lon, radius, start, end):
+        """דירוג מינים ברדיוס (אותו מבנה כמו build_species_stats): תאים שכולם בתוך
+        העיגול נקראים מהסיכום היומי, ותאי השפה מהתצפיות עצמן עם סינון מרחק מדויק"""
+        inside, boundary = cells_in_radius(lat, lon, radius, self.cell_deg)
+        parts = []
+        if inside:
+            parts.append(self._query(f"""
+                SELECT sci_name, MAX(com_name) AS com_name, SUM(observations) AS observations,
+                       SUM(individuals) AS individuals
+                FROM daily_species WHERE region IN ({_placeholders(inside)}) AND obs_date BETWEEN ? AND ?
+                GROUP BY sci_name
+            """, (*inside, str(start), str(end))))
+        if boundary:
+            edge = self._query(f"""
+                SELECT sci_name, com_name, lat, lng, COALESCE(count, 1) AS individuals FROM observations
+                WHERE region IN ({_placeholders(boundary)}) AND obs_date BETWEEN ? AND ?
+            """, (*boundary, str(start), str(end)))
+            edge = edge[haversine(lat, lon, edge['lat'].to_numpy(), edge['lng'].to_numpy()) <= radius]
+            parts.append(edge.groupby('sci_name', as_index=False).agg(
+                com_name=('com_name', 'max'), observations=('sci_name', 'size'), individuals=('individuals', 'sum')
+            ))
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame(columns=['observations', 'individuals'])
+        combined = pd.concat(parts)
+        # כמו build_species_stats: קיבוץ לפי השם המקובל (תתי-מינים מתאחדים), שם מדעי אם חסר
+        names = combined['com_name'].fillna(combined['sci_name']).rename('comName')
+        ranking = combined.groupby(names)[['observations', 'individuals']].sum().astype(int)
+        return ranking.sort_values(['observations', 'individuals'], ascending=False, kind='stable')
+
+    def stats(self):
+        """סיכום הארכיון מטבלת archive_meta - שורה אחת, בלי לסרוק את התצפיות"""
+        with self.lock:
+            rows, first, last, ingested, backfilled = self.conn.execute(
+                "SELECT rows, first_date, last_date, ingested_at, backfilled FROM archive_meta"
+            ).fetchone()
+        return {"rows": rows, "first_date": first, "last_date": last, "ingested_at": ingested,
+                "backfilled_days": backfilled}
+
+    def backfilled(self, codes, days):
+        with self.lock:
+            done = self.conn.execute(
+                f"SELECT code, obs_date FROM backfill_log WHERE code IN ({_placeholders(codes)})", tuple(codes)
+            ).fetchall()
+        return {(code, obs_date) for code, obs_date in done} & {(code, str(day)) for code in codes for day in days}
+
+    def _log_backfill(self, code, day, rows):
+        with self.lock:
+            record = (code, str(day), rows, time.time())
+            if self.conn.execute("INSERT OR IGNORE INTO backfill_log VALUES (?, ?, ?, ?)", record).rowcount:
+                self.conn.execute("UPDATE archive_meta SET backfilled = backfilled + 1")
+            else:
+                self.conn.execute("UPDATE backfill_log SET rows = ?, fetched_at = ? WHERE code = ? AND obs_date = ?",
+                                  (rows, record[3], code, str(day)))
+            self.conn.commit()
+
+    def backfill(self, engine, hotspots, start, end, max_requests=BACKFILL_MAX_REQUESTS, progress=None):
+        """מילוי הארכיון מה-endpoint ההיסטורי עבור כל (מוקד, יום) בטווח שטרם נשלף.
+        הימים האחרונים נשלפים ראשונים, ובכל יום המוקדים לפי הסדר שהתקבל (backfill_targets);
+        מוקד שלא נצפה בו דבר מאז היום המבוקש מדולג. מחזיר סיכום (בקשות, שורות שנוספו, שגיאות)"""
+        days = [end - timedelta(days=i) for i in range((end - start).days + 1)]
+        by_id = {hotspot['locId']: hotspot for hotspot in hotspots}
+        done = self.backfilled(list(by_id), days) if by_id else set()
+        jobs = [(loc_id, day) for day in days for loc_id, hotspot in by_id.items()
+                if (loc_id, str(day)) not in done and _observed_since(hotspot, day)][:max_requests]
+        summary = {"requests": len(jobs), "added": 0, "errors": []}
+        with ThreadPoolExecutor(max_workers=engine.max_workers) as pool:
+            futures = {pool.submit(engine.get_historic_observations, loc_id, day): (loc_id, day) for loc_id, day in jobs}
+            for finished, future in enumerate(as_completed(futures), 1):
+                loc_id, day = futures[future]
+                hotspot = by_id[loc_id]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    summary["errors"].append({"code": loc_id, "date": str(day), "error": str(e)})
+                    continue
+                location = {key: hotspot[key] for key in ('locId', 'locName', 'lat', 'lng') if key in hotspot}
+                rows = [dict(location, **obs) for obs in rows]
+                summary["added"] += self.append(normalize_observations(rows), source="historic")
+                self._log_backfill(loc_id, day, len(rows))
+                if progress:
+                    progress(finished / len(jobs), f"{hotspot.get('locName', loc_id)} {day}: {len(rows)} תצפיות")
+        return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ארכיון התצפיות המקומי")
+    parser.add_argument("--path", default=ARCHIVE_PATH, help="קובץ הארכיון")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="סיכום תוכן הארכיון")
+    backfill = commands.add_parser("backfill", help="מילוי אחורה מה-endpoint ההיסטורי, לכל מוקד ברדיוס")
+    backfill.add_argument("--api-key", default=os.environ.get("EBIRD_API_KEY"),
+                          help="מפתח eBird (ברירת מחדל: EBIRD_API_KEY)")
+    backfill.add_argument("--lat", type=float, required=True)
+    backfill.add_argument("--lon", type=float, required=True)
+    backfill.add_argument("--radius", type=int, default=15, help="רדיוס בק\"מ")
+    backfill.add_argument("--days", type=int, default=30, help="כמה ימים אחורה מאתמול")
+    backfill.add_argument("--max-requests", type=int, default=BACKFILL_MAX_REQUESTS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    archive = ObservationArchive(args.path)
+    if args.command == "backfill":
+        if not args.api_key:
+            parser.error("נדרש מפתח API (--api-key או EBIRD_API_KEY)")
+        engine = eBirdEngine(args.api_key, cache=ObservationCache(CACHE_PATH), catalog=HotspotCatalog())
+        hotspots = backfill_targets(engine, args.lat, args.lon, args.radius)
+        end = date.today() - timedelta(days=1)
+        summary = archive.backfill(engine, hotspots, end - timedelta(days=args.days - 1), end, args.max_requests,
+                                   progress=lambda fraction, message: logger.info("%3.0f%% %s", fraction * 100, message))
+        logger.info("%d בקשות, %d תצפיות חדשות, %d שגיאות",
+                    summary["requests"], summary["added"], len(summary["errors"]))
+    for key, value in archive.stats().items():
+        print(f"{key}: {value}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
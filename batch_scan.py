@@ -0,0 +1,166 @@
+"""סריקה מרוכזת ללא ממשק: סורק רשימת אזורים במקביל ושומר תמונות מצב עמודתיות
+
+שימוש:
+    python batch_scan.py --api-key KEY --radius 25 --days 14
+    python batch_scan.py --regions regions.json --format feather --parallel 4
+    python batch_scan.py --archive   # גם הוספה לארכיון התצפיות המקומי (archive.py)
+
+קובץ האזורים הוא רשימת JSON בפורמט [{"name": "...", "lat": ..., "lon": ...}].
+אזור בלי lat/lon מאותר לפי שמו במאגר היישובים המקומי (עברית או אנגלית).
+ה-UI מציג את תמונות המצב מתוך manifest.json שבתיקיית הפלט.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from archive import ObservationArchive, ARCHIVE_PATH
+from gazetteer import Geocoder
+from ebird_engine import (
+    eBirdEngine, ObservationCache, HotspotCatalog, TokenBucket, ScanMetrics, CACHE_PATH, SNAPSHOT_DIR,
+    MAX_HOTSPOTS, REQUESTS_PER_SECOND, STRATEGIES, METRICS_JSONL_PATH, METRICS_PROM_PATH,
+    save_snapshot, read_manifest, write_manifest, export_metrics
+)
+
+logger = logging.getLogger("batch_scan")
+
+DEFAULT_REGIONS = [
+    {"name": "Jerusalem", "lat": 31.7683, "lon": 35.2137},
+    {"name": "Tel Aviv", "lat": 32.0853, "lon": 34.7818},
+    {"name": "Haifa", "lat": 32.7940, "lon": 34.9896},
+    {"name": "Beer Sheva", "lat": 31.2520, "lon": 34.7915},
+    {"name": "Eilat", "lat": 29.5577, "lon": 34.9519},
+    {"name": "Kfar Saba", "lat": 32.1750, "lon": 34.9060},
+    {"name": "Netanya", "lat": 32.3215, "lon": 34.8532},
+    {"name": "Ashdod", "lat": 31.8014, "lon": 34.6435},
+    {"name": "Tiberias", "lat": 32.7922, "lon": 35.5312},
+    {"name": "Kiryat Shmona", "lat": 33.2073, "lon": 35.5700},
+    {"name": "Beit Shean", "lat": 32.4973, "lon": 35.4966},
+    {"name": "Mitzpe Ramon", "lat": 30.6100, "lon": 34.8017},
+]
+
+def snapshot_filename(name, fmt):
+    """שם קובץ לתמונת מצב: השם עצמו (כולל עברית) וסיומת hash שלו, כך ששמות שונים
+    לא חולקים קובץ גם אם הם נראים זהים אחרי הניקוי"""
+    slug = re.sub(r"[\W_]+", "_", name).strip("_").lower() or "region"
+    digest = hashlib.blake2b(name.encode(), digest_size=3).hexdigest()
+    return f"{slug}_{digest}.{fmt}"
+
+def locate_regions(regions, geocoder):
+    """משלים קואורדינטות לאזורים שהוגדרו לפי שם בלבד; מחזיר (אזורים, מספר שלא אותרו)"""
+    located, missing = [], 0
+    for region in regions:
+        if "lat" not in region or "lon" not in region:
+            try:
+                place = geocoder.resolve(region["name"])
+            except Exception as e:
+                logger.error("איתור %s נכשל: %s", region["name"], e)
+                place = None
+            if place is None:
+                missing += 1
+                logger.error("המקום %s לא נמצא - האזור מדולג", region["name"])
+                continue
+            region = dict(region, lat=place["lat"], lon=place["lon"])
+        located.append(region)
+    return located, missing
+
+def scan_region(region, args, cache, rate_limiter, catalog, totals, archive=None):
+    """סריקת אזור אחד ושמירת תמונת המצב שלו; מחזיר את רשומת ה-manifest"""
+    name = region["name"]
+    engine = eBirdEngine(
+        args.api_key,
+        max_workers=args.workers,
+        cache=cache,
+        rate_limiter=rate_limiter,
+        catalog=catalog,
+        notify=lambda level, message: logger.info("[%s] %s", name, message),
+    )
+    result = engine.scan(region["lat"], region["lon"], region.get("radius", args.radius),
+                         region.get("days", args.days), max_requests=args.max_requests,
+                         time_budget=args.time_budget, strategy=args.strategy)
+    totals.merge(result.metrics)
+    export_metrics(result.metrics, totals, args.metrics_jsonl, args.metrics_prom, region=name)
+    summary = result.metrics.summary()
+    logger.info("[%s] %d בקשות, %d ניסיונות חוזרים, שלבים: %s", name, summary["requests"], summary["retries"],
+                ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in summary["stages"].items()))
+    if archive is not None:
+        logger.info("[%s] %d תצפיות חדשות בארכיון", name, archive.append(result.df))
+    filename = snapshot_filename(name, args.format)
+    save_snapshot(result, os.path.join(args.out, filename), args.format)
+    entry = dict(result.params, name=name, file=filename, rows=len(result.df),
+                 species=int(result.df['sciName'].nunique()) if not result.df.empty else 0,
+                 hotspots=len(result.hotspot_index),
+                 duplicates_removed=int(result.duplicates_removed),
+                 errors=result.errors)
+    return entry
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="סריקת eBird מרוכזת לתמונות מצב")
+    parser.add_argument("--api-key", default=os.environ.get("EBIRD_API_KEY"),
+                        help="מפתח eBird (ברירת מחדל: EBIRD_API_KEY)")
+    parser.add_argument("--regions", help="קובץ JSON עם רשימת אזורים (ברירת מחדל: ערים מרכזיות)")
+    parser.add_argument("--radius", type=int, default=25, help="רדיוס בק\"מ")
+    parser.add_argument("--days", type=int, default=14, help="ימים אחורה")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="תיקיית פלט")
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    parser.add_argument("--parallel", type=int, default=3, help="מספר אזורים במקביל")
+    parser.add_argument("--workers", type=int, default=4, help="בקשות במקביל לכל אזור")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="תקרת בקשות לשנייה (משותפת לכל האזורים)")
+    parser.add_argument("--max-requests", type=int, default=MAX_HOTSPOTS,
+                        help="מקסימום מוקדים לשליפה בכל אזור (לפי סדר עדיפות)")
+    parser.add_argument("--time-budget", type=float, default=None, help="מגבלת זמן בשניות לכל אזור")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="hotspots",
+                        help="hotspots = בקשה לכל מוקד, tiles = אריחים אזוריים (פחות בקשות)")
+    parser.add_argument("--no-cache", action="store_true", help="ללא מטמון מתמשך")
+    parser.add_argument("--archive", nargs="?", const=ARCHIVE_PATH, default=None, metavar="PATH",
+                        help=f"הוספת התצפיות לארכיון המקומי (ברירת מחדל: {ARCHIVE_PATH})")
+    parser.add_argument("--metrics-jsonl", default=METRICS_JSONL_PATH,
+                        help="יומן מדדים (JSON lines) - בקשה לכל שורה וסיכום לכל אזור")
+    parser.add_argument("--metrics-prom", default=METRICS_PROM_PATH,
+                        help="קובץ Prometheus עם המדדים המצטברים של הריצה")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.api_key:
+        parser.error("נדרש מפתח API (--api-key או EBIRD_API_KEY)")
+
+    if args.regions:
+        with open(args.regions, 'r', encoding='utf-8') as f:
+            regions = json.load(f)
+    else:
+        regions = DEFAULT_REGIONS
+
+    os.makedirs(args.out, exist_ok=True)
+    cache = None if args.no_cache else ObservationCache(CACHE_PATH)
+    # מגביל קצב אחד לכל האזורים - התקרה מול eBird היא לכל התהליך
+    rate_limiter = TokenBucket(args.rate)
+    catalog = HotspotCatalog()
+    regions, failed = locate_regions(regions, Geocoder(cache=cache))
+    totals = ScanMetrics()
+    archive = ObservationArchive(args.archive) if args.archive else None
+
+    manifest = {entry["name"]: entry for entry in read_manifest(args.out)}
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        futures = {pool.submit(scan_region, region, args, cache, rate_limiter, catalog, totals, archive): region for region in regions}
+        for future in as_completed(futures):
+            name = futures[future]["name"]
+            try:
+                entry = future.result()
+            except Exception:
+                failed += 1
+                logger.exception("הסריקה של %s נכשלה", name)
+                continue
+            manifest[name] = entry
+            logger.info("%s: %d תצפיות, %d מוקדים, %d שגיאות",
+                        name, entry["rows"], entry["hotspots"], len(entry["errors"]))
+
+    write_manifest(sorted(manifest.values(), key=lambda entry: entry["name"]), args.out)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""מדידת ביצועי הסריקה מול שרת eBird מדומה (mock_ebird.py) - ללא מפתח וללא רשת
+
+לכל גודל נתונים: סריקה מלאה דרך eBirdEngine ועיבוד התוצאה (מרחקים, הסרת כפילויות
+והאגרגציות של הלשוניות). מדווח זמן, מספר בקשות, זיכרון שיא ושורות לשנייה.
+
+שימוש:
+    python benchmark.py
+    python benchmark.py --sizes 50,150,500 --latency 0.08 --error-rate 0.05 --timeout-rate 0.01
+    python benchmark.py --strategy tiles --json bench.json
+    python benchmark.py --dataset recording.json
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+
+from ebird_engine import (
+    eBirdEngine, REQUESTS_PER_SECOND, MAX_WORKERS, STRATEGIES, normalize_observations,
+    build_hotspot_index, build_species_stats, build_species_positions
+)
+from mock_ebird import MockEBirdServer, Faults, synthetic_dataset, load_dataset, DEFAULT_CENTER, DEFAULT_SEED
+
+POST_STEPS = [
+    ("hotspot_index", build_hotspot_index),
+    ("species_stats", build_species_stats),
+    ("species_positions", build_species_positions),
+]
+
+def raw_records(df):
+    """שחזור התצפיות בצורתן הגולמית (כמו מה-API) מתוך מסגרת מנורמלת"""
+    raw = df.drop(columns=['obsKey', 'distance', 'count']).assign(
+        obsDt=df['obsDt'].dt.strftime("%Y-%m-%d %H:%M"), howMany=df['count'].astype(object))
+    return raw.astype(object).where(raw.notna(), None).to_dict('records')
+
+def time_post_processing(df, lat, lon, repeat=3):
+    """זמן (שניות, המיטב מבין repeat) לכל שלב בעיבוד, מחושב מחדש על התצפיות הגולמיות"""
+    rows = raw_records(df)
+    timings = {}
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        value = func(*args)
+        timings[name] = min(timings.get(name, float("inf")), time.perf_counter() - start)
+        return value
+    for _ in range(repeat):
+        normalized = timed("normalize", normalize_observations, rows, lat, lon)
+        for name, step in POST_STEPS:
+            timed(name, step, normalized)
+    return {name: round(seconds, 4) for name, seconds in timings.items()}
+
+def run_scan(server, args, strategy):
+    """סריקה אחת מקצה לקצה; מחזיר את המדדים שלה"""
+    lat, lon = DEFAULT_CENTER
+    engine = eBirdEngine("BENCHMARK", max_workers=args.workers, requests_per_second=args.rate,
+                         base_url=server.url, timeout=args.timeout, notify=lambda level, message: None)
+    server.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = engine.scan(lat, lon, args.radius, args.days, max_requests=args.max_requests, strategy=strategy)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = server.stats()
+    rows = len(result.df)
+    stages = result.metrics.stages
+    build = sum(stages.get(name, 0) for name in ("dedup", "normalize", "distance", "aggregation"))
+    return {
+        "strategy": strategy,
+        "wall_s": round(wall, 3),
+        "fetch_s": round(stages.get("hotspots", 0) + stages.get("fetch", 0), 3),
+        "build_s": round(build, 3),
+        "requests": stats.get("requests", 0),
+        "status_429": stats.get("status:429", 0),
+        "status_503": stats.get("status:503", 0),
+        "timeouts": stats.get("status:timeout", 0),
+        "bytes": stats.get("bytes", 0),
+        "rows": rows,
+        "duplicates": int(result.duplicates_removed),
+        "hotspots": len(result.hotspot_index),
+        "errors": len(result.errors),
+        "rows_per_s": round(rows / wall) if wall else 0,
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "result_mb": round(result.memory_bytes() / 2 ** 20, 2),
+        "cache": result.metrics.cache_ratios(),
+        "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "post": time_post_processing(result.df, lat, lon),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="מדידת ביצועי סריקה מול שרת eBird מדומה")
+    parser.add_argument("--sizes", default="50,150,400", help="מספרי מוקדים בנתונים הסינתטיים")
+    parser.add_argument("--dataset", help="קובץ הקלטה במקום נתונים סינתטיים (גודל יחיד)")
+    parser.add_argument("--species", type=int, default=40, help="ממוצע מינים למוקד")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--strategy", choices=STRATEGIES + ("both",), default="both")
+    parser.add_argument("--radius", type=int, default=50)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--max-requests", type=int, default=10000, help="ברירת מחדל: ללא הגבלה")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND)
+    parser.add_argument("--timeout", type=float, default=2.0, help="timeout של הלקוח (שניות)")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="שיעור תשובות 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="שיעור תשובות 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.005, help="שיעור בקשות שנתקעות")
+    parser.add_argument("--json", metavar="PATH", help="שמירת התוצאות לקובץ JSON (להשוואה בין גרסאות)")
+    args = parser.parse_args(argv)
+
+    strategies = STRATEGIES if args.strategy == "both" else (args.strategy,)
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.server_error_rate,
+                    args.timeout_rate, hang=args.timeout * 2, retry_after=0, seed=args.seed)
+    if args.dataset:
+        datasets = [(args.dataset, load_dataset(args.dataset))]
+    else:
+        datasets = [(int(size), synthetic_dataset(int(size), args.species, seed=args.seed))
+                    for size in args.sizes.split(",")]
+
+    results = []
+    header = (f"{'size':>8} {'strategy':>9} {'wall_s':>7} {'fetch_s':>7} {'build_s':>7} {'reqs':>5} "
+              f"{'429':>4} {'t/o':>4} {'rows':>7} {'rows/s':>7} {'peak_mb':>7} {'res_mb':>7}")
+    print(header)
+    for size, dataset in datasets:
+        with MockEBirdServer(dataset, faults) as server:
+            for strategy in strategies:
+                metrics = dict(size=size, **run_scan(server, args, strategy))
+                results.append(metrics)
+                print(f"{str(size):>8} {strategy:>9} {metrics['wall_s']:>7} {metrics['fetch_s']:>7} "
+                      f"{metrics['build_s']:>7} {metrics['requests']:>5} {metrics['status_429']:>4} "
+                      f"{metrics['timeouts']:>4} {metrics['rows']:>7} {metrics['rows_per_s']:>7} "
+                      f"{metrics['peak_mb']:>7} {metrics['result_mb']:>7}")
+                print(f"{'':>8} {'stages':>9} " + "  ".join(f"{k}={v}" for k, v in metrics['stages'].items()))
+                print(f"{'':>8} {'post':>9} " + "  ".join(f"{k}={v}" for k, v in metrics['post'].items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
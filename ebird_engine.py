@@ -0,0 +1,1232 @@
+"""מנוע eBird: שליפה, מטמון ועיבוד תצפיות - ללא תלות ב-Streamlit"""
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, union_categoricals
+import numpy as np
+import math
+import random
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import logging
+import sqlite3
+import time
+import hashlib
+import json
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+MAX_HOTSPOTS = 150          # תקציב בקשות ברירת מחדל: מספר מוקדים לסריקה
+MAX_WORKERS = 8             # מספר בקשות במקביל
+REQUESTS_PER_SECOND = 20    # תקרת קצב מול eBird
+MAX_RETRIES = 4             # ניסיונות חוזרים על 429/5xx ושגיאות רשת
+BACKOFF_BASE = 0.5          # השהייה בסיסית (שניות) ל-backoff מעריכי
+BACKOFF_MAX = 30            # השהייה מקסימלית בין ניסיונות
+REQUEST_TIMEOUT = 15        # timeout (שניות) לבקשה רגילה; רשימות גדולות מקבלות כפולות שלו
+EBIRD_API_URL = os.environ.get("EBIRD_API_URL", "https://api.ebird.org/v2")   # ניתן להפניה לשרת מדומה
+
+CACHE_PATH = os.environ.get("EBIRD_CACHE_PATH", "ebird_cache.sqlite")
+CACHE_MAX_BYTES = 200 * 1024 * 1024    # תקרת גודל למטמון
+CACHE_TTL = {                          # זמן תוקף (שניות) לכל endpoint
+    "hotspots": 24 * 3600,
+    "observations": 15 * 60,
+    "catalog": 7 * 24 * 3600,
+    "geocode": 90 * 24 * 3600,
+    "geocode_miss": 24 * 3600,         # שם שלא נמצא - ננסה שוב אחרי יום
+}
+MAX_BACK_DAYS = 30                     # מגבלת ה-API לתצפיות אחרונות
+
+# קטלוג המוקדים המקומי: ישראל וכל המדינות שבטווח 50 ק"מ ממנה, כדי שסריקה ליד הגבול
+# (אילת, בקעת הירדן, ירושלים) תכלול גם את המוקדים שמעבר לו
+CATALOG_REGIONS = ("IL", "PS", "JO", "EG", "LB", "SY", "SA")
+CATALOG_GRID_DEG = 0.1                 # גודל תא ברשת האינדקס המרחבי (מעלות)
+CATALOG_RETRY_AFTER = 10 * 60          # אחרי כשל בשליפת הקטלוג - המתנה (שניות) לפני ניסיון נוסף
+# מוקד נחשב לא פעיל אם latestObsDt שלו ישן מחלון הימים בתוספת גיל הקטלוג המקסימלי
+HOTSPOT_STALENESS_DAYS = math.ceil(CACHE_TTL["catalog"] / 86400)
+
+STRATEGIES = ("hotspots", "tiles")     # שליפה מדויקת לפי מוקד / שליפה חסכונית באריחים
+TILE_KM = 5                            # רדיוס אריח התחלתי (ק"מ)
+MIN_TILE_KM = 1.5                      # מתחת לזה מוקדים צפופים נשלפים ישירות
+TILE_MAX_HOTSPOTS = 6                  # אריח עם יותר מוקדים פעילים מתפצל לארבעה
+TILE_MAX_RESULTS = 10000               # תקרת התוצאות של /data/obs/geo/recent
+
+SNAPSHOT_DIR = os.environ.get("EBIRD_SNAPSHOT_DIR", "snapshots")
+MANIFEST_NAME = "manifest.json"
+# סכמת התצפיות הקבועה אחרי הקליטה (normalize_observations) - עמודות אחרות מה-API נזרקות
+OBSERVATION_SCHEMA = {
+    'obsKey': 'uint64',                 # מפתח ייחודיות קנוני (מין, מוקד, תאריך-שעה) - ראו observation_key
+    'speciesCode': 'category',
+    'comName': 'category',
+    'sciName': 'category',
+    'locId': 'category',
+    'locName': 'category',
+    'subId': 'category',
+    'userDisplayName': 'category',
+    'obsDt': 'datetime64[ns]',
+    'count': 'Int32',                   # howMany כמספר; X או חסר = <NA>
+    'lat': 'float32',
+    'lng': 'float32',
+    'distance': 'float32',
+    'obsValid': 'boolean',
+    'obsReviewed': 'boolean',
+}
+CATEGORICAL_COLUMNS = [col for col, dtype in OBSERVATION_SCHEMA.items() if dtype == 'category']
+ACCUMULATOR_CHUNK_ROWS = 5000          # שורות גולמיות שמצטברות לפני נרמול לעמודות
+VERSION_PARAMS = ("lat", "lon", "radius", "days", "strategy")   # פרמטרי סריקה שקובעים את תוכן התוצאה
+
+STORE_MAX_ENTRIES = 16                 # תוצאות סריקה משותפות בזיכרון
+STORE_MAX_BYTES = 512 * 1024 * 1024    # תקרת זיכרון למאגר התוצאות
+STORE_MAX_AGE = CACHE_TTL["observations"]
+STORE_COORD_PRECISION = 2              # עיגול מרכז הסריקה (~1 ק"מ) לצורך איחוד סריקות
+
+METRICS_MAX_REQUESTS = 50000           # בקשות גולמיות שנשמרות לאחוזוני זמן
+METRICS_JSONL_PATH = os.environ.get("EBIRD_METRICS_JSONL")   # יומן בקשות וסיכומי סריקה (JSON lines)
+METRICS_PROM_PATH = os.environ.get("EBIRD_METRICS_PROM")     # קובץ Prometheus למדדים המצטברים
+
+def haversine(lat1, lon1, lat2, lon2):
+    """מרחק haversine בק"מ - מקבל גם מערכים (numpy/pandas) ומחשב וקטורית"""
+    R = 6371
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    dlat, dlon = lat2 - lat1, lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+class TokenBucket:
+    """מגביל קצב (token bucket) משותף לכל ה-threads"""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ממתין עד שמתפנה אסימון לבקשה הבאה"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def endpoint_label(path):
+    """תבנית ה-endpoint ללא מזהים, לצורך קיבוץ מדדים"""
+    path = re.sub(r"^/data/obs/(?!geo/)[^/]+/recent", "/data/obs/{locId}/recent", path)
+    path = re.sub(r"^/data/obs/[^/]+/historic/.*", "/data/obs/{region}/historic/{y}/{m}/{d}", path)
+    return re.sub(r"^/ref/hotspot/(?!geo$)[^/]+$", "/ref/hotspot/{region}", path)
+
+class ScanMetrics:
+    """מדדי סריקה: בקשה-בקשה (זמן, סטטוס, בתים, ניסיונות), משך כל שלב ופגיעות מטמון.
+    המונים מצטברים לתמיד; רשימת הבקשות הגולמית שומרת רק את האחרונות (לאחוזוני זמן).
+    בטוח לשימוש מכמה threads; merge מאפשר צבירה לאורך חיי התהליך"""
+    def __init__(self, scans=0, max_requests=METRICS_MAX_REQUESTS):
+        self.lock = threading.Lock()
+        self.requests = deque(maxlen=max_requests)
+        self.by_status = {}      # (endpoint, status) -> בקשות
+        self.by_endpoint = {}    # endpoint -> סכומי retries/bytes/latency/queued
+        self.stages = {}
+        self.cache = {}
+        self.scans = scans
+
+    def record_request(self, path, status, latency, size=0, retries=0, queued=0.0, backoff=0.0):
+        request = {
+            "endpoint": endpoint_label(path), "status": str(status), "latency": round(latency, 4),
+            "bytes": size, "retries": retries, "queued": round(queued, 4), "backoff": round(backoff, 4),
+        }
+        with self.lock:
+            self._count(request)
+            self.requests.append(request)
+
+    def _count(self, request):
+        key = (request["endpoint"], request["status"])
+        self.by_status[key] = self.by_status.get(key, 0) + 1
+        totals = self.by_endpoint.setdefault(request["endpoint"], dict.fromkeys(
+            ("retries", "bytes", "latency", "queued", "backoff"), 0))
+        for field in totals:
+            totals[field] += request[field]
+
+    def add_time(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def cache_event(self, kind, outcome):
+        """kind: hotspots/observations/tiles; outcome: hit/partial/miss (catalog = תשובה מהקטלוג המקומי)"""
+        with self.lock:
+            self.cache[(kind, outcome)] = self.cache.get((kind, outcome), 0) + 1
+
+    def merge(self, other):
+        """צירוף מדדי סריקה שהסתיימה למדדים המצטברים"""
+        with other.lock:
+            requests, stages, cache = list(other.requests), dict(other.stages), dict(other.cache)
+        with self.lock:
+            for request in requests:
+                self._count(request)
+            self.requests.extend(requests)
+            for stage, seconds in stages.items():
+                self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            for key, count in cache.items():
+                self.cache[key] = self.cache.get(key, 0) + count
+            self.scans += other.scans
+
+    def endpoint_table(self):
+        """סיכום לכל endpoint מתוך הבקשות האחרונות: כמות, שגיאות, ניסיונות חוזרים, בתים ואחוזוני זמן"""
+        with self.lock:
+            requests = pd.DataFrame(list(self.requests))
+        columns = ['requests', 'errors', 'retries', 'bytes', 'p50', 'p95', 'max', 'queued']
+        if requests.empty:
+            return pd.DataFrame(columns=columns)
+        requests['error'] = requests['status'] != "200"
+        grouped = requests.groupby('endpoint', sort=False)
+        table = grouped.agg(requests=('status', 'size'), errors=('error', 'sum'), retries=('retries', 'sum'),
+                            bytes=('bytes', 'sum'), max=('latency', 'max'), queued=('queued', 'sum'))
+        table['p50'] = grouped['latency'].quantile(0.5)
+        table['p95'] = grouped['latency'].quantile(0.95)
+        return table[columns].sort_values('requests', ascending=False)
+
+    def cache_ratios(self):
+        """חלק הפניות שנענו ללא שליפה מלאה מהשרת, לכל סוג מטמון"""
+        with self.lock:
+            cache = dict(self.cache)
+        ratios = {}
+        for kind in sorted({kind for kind, _ in cache}):
+            counts = {outcome: n for (k, outcome), n in cache.items() if k == kind}
+            total = sum(counts.values())
+            served = total - counts.get("miss", 0) - counts.get("partial", 0)
+            ratios[kind] = dict(counts, total=total, hit_ratio=round(served / total, 3))
+        return ratios
+
+    def summary(self):
+        with self.lock:
+            statuses = {}
+            for (_, status), n in self.by_status.items():
+                statuses[status] = statuses.get(status, 0) + n
+            totals = list(self.by_endpoint.values())
+            latencies = sorted(request["latency"] for request in self.requests)
+            stages = {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+        return {
+            "scans": self.scans,
+            "requests": sum(statuses.values()),
+            "statuses": statuses,
+            "retries": sum(t["retries"] for t in totals),
+            "bytes": sum(t["bytes"] for t in totals),
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            "queued_seconds": round(sum(t["queued"] for t in totals), 4),
+            "backoff_seconds": round(sum(t["backoff"] for t in totals), 4),
+            "stages": stages,
+            "cache": self.cache_ratios(),
+        }
+
+    def to_jsonl(self, **labels):
+        """שורת JSON לכל בקשה ושורת סיכום אחרונה; labels (למשל אזור) נוספים לכל שורה"""
+        with self.lock:
+            requests = list(self.requests)
+        lines = [json.dumps(dict(labels, type="request", **request), ensure_ascii=False) for request in requests]
+        lines.append(json.dumps(dict(labels, type="summary", **self.summary()), ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self, prefix="ebird"):
+        """פורמט הטקסט של Prometheus (מתאים ל-textfile collector של node_exporter)"""
+        table = self.endpoint_table()
+        with self.lock:
+            by_status = dict(self.by_status)
+            by_endpoint = {endpoint: dict(totals) for endpoint, totals in self.by_endpoint.items()}
+            stages = dict(self.stages)
+            cache = dict(self.cache)
+
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+        metric("scans_total", "counter", "Completed scans", [({}, self.scans)])
+        metric("requests_total", "counter", "eBird API requests by endpoint and final status",
+               [({"endpoint": endpoint, "status": status}, n) for (endpoint, status), n in sorted(by_status.items())])
+        for field, name, help_text in (
+            ("retries", "request_retries_total", "Retried attempts"),
+            ("bytes", "response_bytes_total", "Response body bytes"),
+            ("queued", "rate_limit_wait_seconds_total", "Seconds waiting for the client-side rate limiter"),
+            ("backoff", "retry_backoff_seconds_total", "Seconds sleeping between retries"),
+        ):
+            metric(name, "counter", f"{help_text} by endpoint",
+                   [({"endpoint": endpoint}, round(totals[field], 4)) for endpoint, totals in sorted(by_endpoint.items())])
+        latency = [({"endpoint": endpoint, "quantile": q}, round(row[col], 4))
+                   for endpoint, row in table.iterrows() for q, col in (("0.5", "p50"), ("0.95", "p95"))]
+        metric("request_latency_seconds", "summary", "Network latency by endpoint (quantiles over recent requests)",
+               latency)
+        for endpoint, totals in sorted(by_endpoint.items()):
+            count = sum(n for (e, _), n in by_status.items() if e == endpoint)
+            lines.append(f'{prefix}_request_latency_seconds_sum{{endpoint="{endpoint}"}} {round(totals["latency"], 4)}')
+            lines.append(f'{prefix}_request_latency_seconds_count{{endpoint="{endpoint}"}} {count}')
+        metric("stage_seconds_total", "counter", "Time spent in each scan stage",
+               [({"stage": stage}, round(seconds, 4)) for stage, seconds in sorted(stages.items())])
+        metric("cache_lookups_total", "counter", "Cache lookups by cache and outcome",
+               [({"cache": kind, "outcome": outcome}, n) for (kind, outcome), n in sorted(cache.items())])
+        return "\n".join(lines) + "\n"
+
+class ObservationCache:
+    """מטמון SQLite מתמשך לתשובות eBird, עם TTL לכל endpoint ופינוי לפי גודל"""
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = dict(CACHE_TTL, **(ttl or {}))
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                back INTEGER,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def _get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT payload, back, fetched_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return {"rows": json.loads(row[0]), "back": row[1], "fetched_at": row[2]}
+
+    def _put(self, key, endpoint, rows, back=None):
+        payload = json.dumps(rows, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, back, payload, len(payload), now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """מפנה את הרשומות שנגישו הכי מזמן עד שהמטמון חוזר מתחת לתקרה"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_hotspots(self, lat, lon, dist):
+        entry = self._get(f"hotspots:{lat:.3f}:{lon:.3f}:{dist}")
+        if entry and time.time() - entry["fetched_at"] < self.ttl["hotspots"]:
+            return entry["rows"]
+        return None
+
+    def put_hotspots(self, lat, lon, dist, hotspots):
+        self._put(f"hotspots:{lat:.3f}:{lon:.3f}:{dist}", "hotspots", hotspots)
+
+    def get_catalog(self, region):
+        """קטלוג המוקדים השמור (rows, fetched_at), או None אם חסר או פג תוקף"""
+        entry = self._get(f"catalog:{region}")
+        if entry and time.time() - entry["fetched_at"] < self.ttl["catalog"]:
+            return entry["rows"], entry["fetched_at"]
+        return None
+
+    def put_catalog(self, region, hotspots):
+        self._put(f"catalog:{region}", "catalog", hotspots)
+
+    def get_tile(self, lat, lng, dist, back):
+        """תשובת geo/recent שמורה לאריח, או None אם חסרה או עברה את ה-TTL של התצפיות"""
+        entry = self._get(f"tile:{lat:.4f}:{lng:.4f}:{dist}:{back}")
+        if entry and time.time() - entry["fetched_at"] < self.ttl["observations"]:
+            return entry["rows"]
+        return None
+
+    def put_tile(self, lat, lng, dist, back, rows):
+        self._put(f"tile:{lat:.4f}:{lng:.4f}:{dist}:{back}", "tiles", rows, back)
+
+    def get_geocode(self, query):
+        """תוצאת גיאוקוד שמורה: [] עבור שם שלא נמצא, None אם חסרה או פג תוקף"""
+        entry = self._get(f"geocode:{query}")
+        if entry is None:
+            return None
+        ttl = self.ttl["geocode"] if entry["rows"] else self.ttl["geocode_miss"]
+        if time.time() - entry["fetched_at"] < ttl:
+            return entry["rows"]
+        return None
+
+    def put_geocode(self, query, places):
+        self._put(f"geocode:{query}", "geocode", places)
+
+    @staticmethod
+    def _within(rows, back):
+        cutoff = (datetime.now() - timedelta(days=back)).strftime("%Y-%m-%d")
+        return [obs for obs in rows if str(obs.get('obsDt', ''))[:10] >= cutoff]
+
+    def lookup_observations(self, loc_id, days):
+        """מחזיר (רשומה שמורה, back לשליפה). back=0 - הרשומה טרייה ואין צורך בפנייה לשרת.
+        entry["window"] הן התצפיות בחלון המבוקש; entry["rows"] נשארות מלאות לצורך המיזוג"""
+        entry = self._get(f"obs:{loc_id}")
+        if entry is None:
+            return None, days
+        age_days = (time.time() - entry["fetched_at"]) / 86400
+        if entry["back"] + age_days < days or age_days >= MAX_BACK_DAYS:
+            return None, days
+        entry["window"] = self._within(entry["rows"], days)
+        if age_days * 86400 < self.ttl["observations"]:
+            return entry, 0
+        return entry, max(1, math.ceil(age_days))
+
+    def merge_observations(self, loc_id, entry, fresh, days):
+        """ממזג שליפה חלקית (back קטן) לתוך הרשומה השמורה ומחזיר את החלון המבוקש"""
+        if entry is None:
+            self._put(f"obs:{loc_id}", "observations", fresh, days)
+            return fresh
+        # לכל מין נשמרת התצפית האחרונה, כמו בתשובת ה-API
+        latest = {obs.get('sciName'): obs for obs in entry["rows"]}
+        latest.update({obs.get('sciName'): obs for obs in fresh})
+        age_days = (time.time() - entry["fetched_at"]) / 86400
+        back = min(MAX_BACK_DAYS, max(days, int(entry["back"] + age_days)))
+        rows = self._within(list(latest.values()), back)
+        self._put(f"obs:{loc_id}", "observations", rows, back)
+        return self._within(rows, days)
+
+class HotspotCatalog:
+    """קטלוג מוקדים מקומי (ישראל והשכנות) עם אינדקס רשת מרחבי.
+    שאילתת (lat, lon, dist) נענית ללא פנייה לרשת, מהקרוב לרחוק, כולל מרחק לכל מוקד.
+    הקטלוג מתרענן מ-/ref/hotspot/{region} לכל אזור כשפג תוקפו במטמון"""
+    def __init__(self, regions=CATALOG_REGIONS, cell_deg=CATALOG_GRID_DEG, max_age=CACHE_TTL["catalog"],
+                 retry_after=CATALOG_RETRY_AFTER):
+        self.regions = tuple(regions)
+        self.cell_deg = cell_deg
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.fetched_at = None
+        self.failed_at = None
+        self.rows = []
+
+    def _build(self, rows, fetched_at):
+        self.rows = rows
+        self.fetched_at = fetched_at
+        self.lat = np.array([h['lat'] for h in rows], dtype=float)
+        self.lng = np.array([h['lng'] for h in rows], dtype=float)
+        self.cells = {}
+        cell_i = np.floor(self.lat / self.cell_deg).astype(int)
+        cell_j = np.floor(self.lng / self.cell_deg).astype(int)
+        for idx, key in enumerate(zip(cell_i.tolist(), cell_j.tolist())):
+            self.cells.setdefault(key, []).append(idx)
+        self.cells = {key: np.array(idxs) for key, idxs in self.cells.items()}
+        if rows:
+            self.bounds = (self.lat.min(), self.lat.max(), self.lng.min(), self.lng.max())
+
+    def ensure(self, engine):
+        """טוען/מרענן את הקטלוג (מהמטמון או מה-API). מחזיר False אם אינו זמין.
+        הקטלוג נבנה רק כשכל האזורים זמינים - קטלוג חלקי היה מאבד מוקדים ליד הגבול בשקט.
+        אחרי שליפה שנכשלה לא מנסים שוב במשך retry_after, כדי שסריקות לא ימתינו לה בכל פעם"""
+        with self.lock:
+            if self.fetched_at is not None and time.time() - self.fetched_at < self.max_age:
+                return bool(self.rows)
+            rows, fetched = {}, []
+            for region in self.regions:
+                cached = engine.cache.get_catalog(region) if engine.cache else None
+                if cached is None:
+                    if self.failed_at is not None and time.time() - self.failed_at < self.retry_after:
+                        return bool(self.rows)
+                    try:
+                        region_rows = engine._get(f"/ref/hotspot/{region}", {"fmt": "json"},
+                                                  timeout=4 * engine.timeout)
+                    except Exception as e:
+                        self.failed_at = time.time()
+                        engine.notify("warning", f"קטלוג המוקדים ({region}) אינו זמין - שאילתה ישירה: {e}")
+                        return bool(self.rows)
+                    if engine.cache:
+                        engine.cache.put_catalog(region, region_rows)
+                    cached = (region_rows, time.time())
+                rows.update((h['locId'], h) for h in cached[0])
+                fetched.append(cached[1])
+            self.failed_at = None
+            self._build(list(rows.values()), min(fetched))
+            return bool(self.rows)
+
+    def covers(self, lat, lon, dist=0):
+        """האם כל העיגול (ולא רק מרכזו) בתחום הקטלוג"""
+        if not self.rows:
+            return False
+        dlat = dist / 111.0
+        dlng = dist / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        lat_min, lat_max, lng_min, lng_max = self.bounds
+        return lat_min <= lat - dlat and lat + dlat <= lat_max and lng_min <= lon - dlng and lon + dlng <= lng_max
+
+    def query(self, lat, lon, dist):
+        """כל המוקדים ברדיוס dist ק"מ, מהקרוב לרחוק, עם שדה distance"""
+        dlat = dist / 111.0
+        dlng = dist / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        i0, i1 = math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg)
+        j0, j1 = math.floor((lon - dlng) / self.cell_deg), math.floor((lon + dlng) / self.cell_deg)
+        buckets = [
+            self.cells[(i, j)]
+            for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)
+            if (i, j) in self.cells
+        ]
+        if not buckets:
+            return []
+        candidates = np.concatenate(buckets)
+        distances = haversine(lat, lon, self.lat[candidates], self.lng[candidates])
+        inside = distances <= dist
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return [dict(self.rows[idx], distance=float(distances[pos])) for pos, idx in
+                zip(order.tolist(), candidates[order].tolist())]
+
+def rank_hotspots(hotspots, lat, lon, dist, days):
+    """דירוג מוקדים לפני שליפה: פעילות אחרונה (latestObsDt), עושר מינים
+    (numSpeciesAllTime) וקרבה למרכז. מוקדים ללא תצפית בחלון הימים יורדים לסוף.
+    מוקדים בלי שדה distance (מ-/ref/hotspot/geo) מקבלים אותו כאן"""
+    if not hotspots:
+        return []
+    missing = [h for h in hotspots if h.get('distance') is None]
+    if missing:
+        distances = haversine(lat, lon, [h['lat'] for h in missing], [h['lng'] for h in missing])
+        for hotspot, distance in zip(missing, distances.tolist()):
+            hotspot['distance'] = distance
+    today = datetime.now().date()
+    max_richness = math.log1p(max(h.get('numSpeciesAllTime') or 0 for h in hotspots)) or 1.0
+    for hotspot in hotspots:
+        try:
+            age = (today - datetime.strptime(str(hotspot['latestObsDt'])[:10], "%Y-%m-%d").date()).days
+        except (KeyError, ValueError):
+            age = None
+        recency = 0.5 if age is None else max(0.0, 1 - age / days)
+        richness = math.log1p(hotspot.get('numSpeciesAllTime') or 0) / max_richness
+        proximity = 1 - min(hotspot['distance'], dist) / dist if dist else 1.0
+        hotspot['active'] = age is None or age <= days + HOTSPOT_STALENESS_DAYS
+        hotspot['priority'] = 0.5 * richness + 0.3 * recency + 0.2 * proximity
+    return sorted(hotspots, key=lambda h: (h['active'], h['priority']), reverse=True)
+
+def plan_fetch(lat, lon, hotspots, tile_km=TILE_KM, min_tile_km=MIN_TILE_KM, max_per_tile=TILE_MAX_HOTSPOTS):
+    """מתכנן שליפה חסכונית: מחלק את המוקדים לאריחים ריבועיים (כל אריח נשלף בקריאת
+    /data/obs/geo/recent אחת על המעגל החוסם אותו). אריח צפוף מתפצל לארבעה, ומוקדים
+    שנשארים צפופים גם באריח המינימלי נשלפים ישירות. מחזיר (tiles, direct)"""
+    kx = 111.0 * math.cos(math.radians(lat))
+    ky = 111.0
+    tiles, direct = [], []
+
+    def place(members, x0, y0, side):
+        radius = side / math.sqrt(2)
+        if len(members) <= max_per_tile:
+            cx, cy = x0 + side / 2, y0 + side / 2
+            tiles.append({"lat": lat + cy / ky, "lng": lon + cx / kx, "radius": radius,
+                          "hotspots": [h for h, _, _ in members]})
+        elif radius / 2 < min_tile_km:
+            direct.extend(h for h, _, _ in members)
+        else:
+            half = side / 2
+            quadrants = {}
+            for member in members:
+                _, x, y = member
+                quadrants.setdefault((int(x >= x0 + half), int(y >= y0 + half)), []).append(member)
+            for (qx, qy), sub in quadrants.items():
+                place(sub, x0 + qx * half, y0 + qy * half, half)
+
+    side = tile_km * math.sqrt(2)
+    cells = {}
+    for hotspot in hotspots:
+        x, y = (hotspot['lng'] - lon) * kx, (hotspot['lat'] - lat) * ky
+        cells.setdefault((math.floor(x / side), math.floor(y / side)), []).append((hotspot, x, y))
+    for (i, j), members in cells.items():
+        place(members, i * side, j * side, side)
+    return tiles, direct
+
+def log_notify(level, message):
+    """דיווח ברירת מחדל - ל-logging (ה-UI מחליף אותו בהודעות Streamlit)"""
+    logger.log(logging.WARNING if level in ("warning", "error") else logging.INFO, message)
+
+class eBirdEngine:
+    def __init__(self, api_key, max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND,
+                 cache=None, rate_limiter=None, catalog=None, notify=log_notify,
+                 base_url=EBIRD_API_URL, timeout=REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.headers = {"X-eBirdApiToken": api_key}
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or TokenBucket(requests_per_second)
+        self.cache = cache
+        self.catalog = catalog
+        self.notify = notify
+        self.scan_errors = []
+        self.scan_coverage = {}
+        self.metrics = ScanMetrics()
+        self.errors_lock = threading.Lock()
+        
+        # session משותף עם מאגר חיבורים (keep-alive) בגודל מספר ה-threads
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def _retry_delay(response, attempt):
+        """זמן המתנה לפני ניסיון חוזר: Retry-After אם נשלח, אחרת backoff מעריכי עם jitter"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(BACKOFF_MAX, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(retry_after)
+                    return min(BACKOFF_MAX, max(0.0, (when - datetime.now(when.tzinfo)).total_seconds()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _get(self, path, params=None, timeout=None):
+        """GET דרך ה-session המשותף, עם מגביל קצב וניסיונות חוזרים על 429/5xx.
+        כל קריאה נרשמת ב-metrics: זמן רשת, המתנה למגביל ול-backoff, סטטוס, בתים וניסיונות"""
+        started = time.perf_counter()
+        queued = backoff = 0.0
+        status, size, attempt = None, 0, 0
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                waited = time.perf_counter()
+                self.rate_limiter.acquire()
+                queued += time.perf_counter() - waited
+                try:
+                    response = self.session.get(f"{self.base_url}{path}", params=params,
+                                                timeout=timeout or self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    status = type(e).__name__
+                    if attempt == MAX_RETRIES:
+                        raise
+                    delay = self._retry_delay(None, attempt)
+                    backoff += delay
+                    time.sleep(delay)
+                    continue
+                status, size = response.status_code, len(response.content)
+                if (response.status_code == 429 or response.status_code >= 500) and attempt < MAX_RETRIES:
+                    delay = self._retry_delay(response, attempt)
+                    backoff += delay
+                    time.sleep(delay)
+                    continue
+                response.raise_for_status()
+                return response.json()
+        finally:
+            latency = time.perf_counter() - started - queued - backoff
+            self.metrics.record_request(path, status, latency, size, attempt, queued, backoff)
+
+    def _record_error(self, loc_id, loc_name, error):
+        with self.errors_lock:
+            self.scan_errors.append({"locId": loc_id, "locName": loc_name, "error": str(error)})
+
+    def get_hotspots_in_region(self, lat, lon, dist):
+        """שליפת כל ה-hotspots באזור - מהקטלוג המקומי אם הוא מכסה את הנקודה"""
+        if self.catalog is not None and self.catalog.ensure(self) and self.catalog.covers(lat, lon, dist):
+            self.metrics.cache_event("hotspots", "catalog")
+            return self.catalog.query(lat, lon, dist)
+        if self.cache:
+            cached = self.cache.get_hotspots(lat, lon, dist)
+            self.metrics.cache_event("hotspots", "miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+        try:
+            params = {"lat": lat, "lng": lon, "dist": dist, "fmt": "json"}
+            hotspots = self._get("/ref/hotspot/geo", params, timeout=2 * self.timeout)
+            if self.cache:
+                self.cache.put_hotspots(lat, lon, dist, hotspots)
+            return hotspots
+        except Exception as e:
+            self._record_error(None, "רשימת מוקדים", e)
+            self.notify("warning", f"שגיאה בשליפת hotspots: {e}")
+        return []
+
+    def get_species_list_for_location(self, loc_id, days):
+        """שליפת רשימת כל המינים במוקד מסוים"""
+        entry, back = self.cache.lookup_observations(loc_id, days) if self.cache else (None, days)
+        if self.cache:
+            self.metrics.cache_event("observations", "hit" if back == 0 else "partial" if entry else "miss")
+        if back == 0:
+            return entry["window"]
+        try:
+            fresh = self._get(f"/data/obs/{loc_id}/recent", {"back": back})
+        except Exception:
+            # במקרה של כשל - עדיף נתונים שמורים מעט ישנים על פני מוקד ריק
+            if entry is None:
+                raise
+            return entry["window"]
+        if self.cache:
+            return self.cache.merge_observations(loc_id, entry, fresh, days)
+        return fresh
+
+    def get_historic_observations(self, region_code, day):
+        """תצפיות של יום מסוים מ-/historic (ללא מגבלת 30 הימים). region_code הוא מזהה
+        מוקד או קוד אזור (IL, IL-M). לכל מין מוחזרת רק התצפית האחרונה באותו יום בכל
+        האזור - ולכן לתמונה מלאה שולפים מוקד-מוקד (archive.backfill_targets)"""
+        params = {"rank": "mrec", "detail": "simple", "maxResults": TILE_MAX_RESULTS, "fmt": "json"}
+        return self._get(f"/data/obs/{region_code}/historic/{day.year}/{day.month}/{day.day}", params,
+                         timeout=2 * self.timeout)
+
+    def _fetch_tile(self, tile, days):
+        """קריאת geo/recent אחת לאריח, מוגבלת למוקדים (נשמרת במטמון כמו תצפיות מוקד)"""
+        lat, lng, dist = round(tile["lat"], 4), round(tile["lng"], 4), max(1, math.ceil(tile["radius"]))
+        if self.cache:
+            cached = self.cache.get_tile(lat, lng, dist, days)
+            self.metrics.cache_event("tiles", "miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+        params = {
+            "lat": lat, "lng": lng, "dist": dist, "back": days, "hotspot": "true",
+            "includeProvisional": "true", "maxResults": TILE_MAX_RESULTS, "fmt": "json",
+        }
+        rows = self._get("/data/obs/geo/recent", params, timeout=2 * self.timeout)
+        if self.cache:
+            self.cache.put_tile(lat, lng, dist, days, rows)
+        return rows
+
+    @staticmethod
+    def _attach_location(hotspot, observations):
+        """הוספת המידע על המיקום לכל תצפית"""
+        for obs in observations:
+            obs['locName'] = hotspot['locName']
+            obs['lat'] = hotspot['lat']
+            obs['lng'] = hotspot['lng']
+            if 'distance' in hotspot:
+                obs['distance'] = hotspot['distance']
+        return observations
+
+    def iter_scan(self, lat, lon, dist, days, progress=None, max_requests=MAX_HOTSPOTS, time_budget=None,
+                  strategy="hotspots"):
+        """מחולל: מניב (hotspot, observations) לכל מוקד ברגע שהשליפה שלו הסתיימה.
+        מוקדים לא פעילים מדולגים, והשאר נשלפים לפי סדר עדיפות עד max_requests או עד תום
+        time_budget שניות. ב-strategy="tiles" המוקדים נשלפים באריחים (ראו plan_fetch);
+        מוקד שהאריח השאיר ריק, וכל מוקדי אריח שנכשל, נשלפים ישירות.
+        סגירת המחולל (ביטול) מבטלת את הבקשות שטרם יצאו"""
+        self.scan_errors = []
+        self.scan_coverage = {}
+        self.metrics = ScanMetrics(scans=1)
+        
+        # שלב 1: שליפת כל ה-hotspots
+        if progress:
+            progress(0.1, "שולף רשימת מוקדים...")
+        
+        with self.metrics.stage("hotspots"):
+            hotspots = self.get_hotspots_in_region(lat, lon, dist)
+        
+        if not hotspots:
+            self.notify("warning", "לא נמצאו hotspots באזור - מנסה שיטה חלופית...")
+            yield from self.iter_basic_data(lat, lon, dist, days, progress)
+            return
+        
+        # שלב 2: דירוג ותכנון - מוקד ללא תצפית בחלון הימים לא יחזיר נתונים ולכן לא נשלף
+        ranked = rank_hotspots(hotspots, lat, lon, dist, days)
+        targets = [h for h in ranked if h['active']][:max_requests]
+        tiles, direct = plan_fetch(lat, lon, targets) if strategy == "tiles" else ([], targets)
+        self.notify("info", f"נמצאו {len(hotspots)} מוקדים - שואב נתונים מ-{len(targets)} מוקדים פעילים "
+                            f"ב-{len(tiles) + len(direct)} בקשות...")
+        
+        # שלב 3: שליפה מקבילית - ה-pool מריץ לפי סדר ההגשה, כך שהחשובים נשלפים ראשונים
+        fetched = []
+        resolved = 0
+        deadline = time.monotonic() + time_budget if time_budget else None
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        try:
+            for tile in tiles:
+                pending[pool.submit(self._fetch_tile, tile, days)] = ("tile", tile)
+            for hotspot in direct:
+                pending[pool.submit(self.get_species_list_for_location, hotspot['locId'], days)] = ("hotspot", hotspot)
+            
+            while pending:
+                # עם תקציב זמן ההמתנה מוגבלת, כדי שבקשה תקועה לא תדחה את העצירה
+                timeout = max(0, deadline - time.monotonic()) if deadline else None
+                finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    kind, job = pending.pop(future)
+                    if future.cancelled():
+                        continue
+                    if kind == "tile":
+                        try:
+                            rows = future.result()
+                        except Exception as e:
+                            self._record_error(None, f"אריח ({job['lat']:.3f}, {job['lng']:.3f})", e)
+                            rows = None
+                        # חיבור התוצאות למטא-דאטה של המוקדים באריח לפי locId
+                        by_location = {}
+                        for obs in rows or []:
+                            by_location.setdefault(obs.get('locId'), []).append(obs)
+                        # geo/recent מחזיר תצפית אחת לכל מין, ולכן מוקד פעיל שכל מיניו נצפו מאוחר יותר
+                        # במוקד שכן נשאר ריק. מוקדים כאלה (וכל מוקדי אריח שנכשל) נשלפים ישירות
+                        batches = []
+                        for hotspot in job["hotspots"]:
+                            if hotspot['locId'] in by_location:
+                                batches.append((hotspot, by_location[hotspot['locId']], True))
+                            else:
+                                pending[pool.submit(self.get_species_list_for_location, hotspot['locId'], days)] = ("hotspot", hotspot)
+                    else:
+                        try:
+                            batches = [(job, future.result(), True)]
+                        except Exception as e:
+                            self._record_error(job['locId'], job['locName'], e)
+                            batches = [(job, [], False)]
+                    
+                    for hotspot, observations, ok in batches:
+                        resolved += 1
+                        if ok:
+                            fetched.append(hotspot)
+                        if progress and (resolved % 5 == 0 or resolved == len(targets)):
+                            progress(0.1 + (resolved / len(targets)) * 0.8, f"עיבוד מוקד {resolved}/{len(targets)}...")
+                        yield hotspot, self._attach_location(hotspot, observations)
+                
+                if deadline and time.monotonic() >= deadline:
+                    for future in pending:
+                        future.cancel()
+                    self.notify("info", f"תקציב הזמן הסתיים אחרי {resolved} מוקדים")
+                    break
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.scan_coverage = coverage_report(ranked, fetched)
+
+    def scan(self, lat, lon, dist, days, progress=None, on_batch=None,
+             max_requests=MAX_HOTSPOTS, time_budget=None, strategy="hotspots"):
+        """סריקה מלאה בזרימה: כל מוקד נקלט מיד ל-ScanAccumulator, ו-on_batch מקבל
+        את המצטבר אחרי כל אצווה (להצגה חיה). ביטול באמצע משאיר את המצטבר תקין"""
+        batches = self.iter_scan(lat, lon, dist, days, progress, max_requests, time_budget, strategy)
+        started = time.perf_counter()
+        accumulator = ScanAccumulator(lat, lon, dist, days, strategy)
+        try:
+            for hotspot, observations in batches:
+                # iter_scan מתחיל ScanMetrics חדש כשהוא רץ; dedup, normalize ו-distance נמדדים בתוך add
+                accumulator.metrics = self.metrics
+                accumulator.add(hotspot, observations)
+                if on_batch:
+                    with self.metrics.stage("live_view"):
+                        on_batch(accumulator)
+        finally:
+            batches.close()
+            # זמן השליפה = כל הלולאה פחות השלבים שנמדדו בתוכה
+            self.metrics.add_time("fetch", time.perf_counter() - started - sum(self.metrics.stages.values()))
+        
+        if progress:
+            progress(0.95, "ממזג נתונים...")
+        return accumulator.to_result(self.scan_errors, coverage=self.scan_coverage, metrics=self.metrics)
+
+    def iter_basic_data(self, lat, lon, dist, days, progress=None):
+        """שיטה בסיסית כגיבוי - מניבה את התצפיות מקובצות לפי מיקום"""
+        all_data = []
+        
+        base_params = {
+            "lat": lat, "lng": lon, "dist": dist, "back": days,
+            "fmt": "json", "includeProvisional": "true", "maxResults": 10000
+        }
+        
+        endpoints = [
+            "/data/obs/geo/recent",
+            "/data/obs/geo/recent/notable",
+        ]
+        
+        for idx, path in enumerate(endpoints):
+            try:
+                if progress:
+                    progress((idx + 1) / 3, f"שולף נתונים {idx + 1}/2...")
+                all_data.extend(self._get(path, base_params, timeout=2 * self.timeout))
+            except Exception as e:
+                self._record_error(None, path, e)
+                self.notify("warning", f"שגיאה: {e}")
+        
+        by_location = {}
+        for obs in all_data:
+            by_location.setdefault(obs['locId'], []).append(obs)
+        for loc_id, observations in by_location.items():
+            first = observations[0]
+            yield {'locId': loc_id, 'locName': first.get('locName'), 'lat': first['lat'], 'lng': first['lng']}, observations
+
+def coverage_report(ranked, fetched):
+    """כמה מהאזור נסרק בפועל: מוקדים, מוקדים פעילים, וחלק ה"פעילות" (עושר מינים) שכוסה"""
+    active = [h for h in ranked if h.get('active', True)]
+    fetched_ids = {h['locId'] for h in fetched}
+    total_weight = sum(h.get('numSpeciesAllTime') or 1 for h in active)
+    covered_weight = sum(h.get('numSpeciesAllTime') or 1 for h in active if h['locId'] in fetched_ids)
+    return {
+        "hotspots_total": len(ranked),
+        "hotspots_active": len(active),
+        "hotspots_fetched": len(fetched_ids),
+        "active_fetched": sum(1 for h in active if h['locId'] in fetched_ids),
+        "activity_covered": round(covered_weight / total_weight, 3) if total_weight else 1.0,
+    }
+
+def canonical_obs_dt(obs_dt):
+    """תאריך-שעה בצורה "%Y-%m-%d %H:%M" - תאריך בלבד ("2026-10-16") מקבל 00:00, חסר - מחרוזת ריקה"""
+    if isinstance(obs_dt, str) and len(obs_dt) == 16 and obs_dt[10] == ' ':
+        return obs_dt               # הצורה הרגילה של ה-API - בלי פענוח
+    if obs_dt is None or pd.isna(obs_dt):
+        return ""
+    try:
+        return pd.Timestamp(obs_dt).strftime("%Y-%m-%d %H:%M")
+    except (ValueError, TypeError):
+        return str(obs_dt)[:16]
+
+def observation_key(sci_name, loc_id, obs_dt):
+    """מפתח ייחודיות קנוני: hash יציב של 64 ביט על (מין, מוקד, תאריך-שעה).
+    זהה בין תהליכים והרצות, כך שאפשר למזג גם תמונות מצב וארכיון"""
+    text = f"{sci_name}|{loc_id}|{canonical_obs_dt(obs_dt)}"
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+def dataset_version(df, params=None):
+    """גרסת תוכן של תוצאה: hash של מפתחות התצפיות וכמויותיהן (ללא תלות בסדר) ושל פרמטרי
+    הסריקה שקובעים את התוכן (VERSION_PARAMS). זמן הסריקה, כיסוי וכדומה לא נכללים, כך
+    שתוצאות זהות - גם מסשנים, סריקות או טעינות שונות - מקבלות אותה גרסה"""
+    digest = hashlib.blake2b(digest_size=8)
+    if not df.empty:
+        order = np.argsort(df['obsKey'].to_numpy(), kind="stable")
+        digest.update(df['obsKey'].to_numpy()[order].tobytes())
+        digest.update(df['count'].fillna(-1).to_numpy(dtype=np.int64)[order].tobytes())
+    content_params = {key: (params or {}).get(key) for key in VERSION_PARAMS}
+    digest.update(json.dumps(content_params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def add_distances(df, lat, lon):
+    """חישוב מרחקים פעם אחת בזמן הקליטה - רק לשורות שלא קיבלו מרחק מקטלוג המוקדים"""
+    if df.empty:
+        return
+    if 'distance' not in df.columns:
+        df['distance'] = np.nan
+    missing = df['distance'].isna().to_numpy()
+    if missing.any():
+        distances = haversine(lat, lon, df.loc[missing, 'lat'].to_numpy(), df.loc[missing, 'lng'].to_numpy())
+        # במסגרת מנורמלת העמודה float32 - המרחקים נשמרים באותו טיפוס
+        df.loc[missing, 'distance'] = distances.astype(df['distance'].dtype, copy=False) \
+            if df['distance'].dtype.kind == 'f' else distances
+
+class ScanAccumulator:
+    """מצטבר תוצאות סריקה בזרימה: הסרת כפילויות ואגרגציות שמתעדכנות עם כל מוקד.
+    עם metrics נמדדים השלבים dedup, normalize ו-distance בכל מקום שהם רצים"""
+    def __init__(self, lat, lon, dist, days, strategy="hotspots", metrics=None):
+        self.lat, self.lon = lat, lon
+        self.metrics = metrics
+        self.params = {"lat": lat, "lon": lon, "radius": dist, "days": days, "strategy": strategy}
+        self.pending = []           # תצפיות גולמיות שטרם נורמלו
+        self.chunks = []            # מסגרות מנורמלות (ACCUMULATOR_CHUNK_ROWS שורות כל אחת)
+        self.seen = set()           # מפתחות observation_key - מספרים במקום tuples של מחרוזות
+        self.row_count = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.hotspots = {}
+        self.species = {}
+
+    def _stage(self, name):
+        return self.metrics.stage(name) if self.metrics else nullcontext()
+
+    def add(self, hotspot, observations):
+        self.batches += 1
+        with self._stage("dedup"):
+            self._add(observations)
+        if len(self.pending) >= ACCUMULATOR_CHUNK_ROWS:
+            self._flush()
+
+    def _add(self, observations):
+        for obs in observations:
+            # הסרת הכפילויות היחידה בצנרת: אותו מין, מקום ותאריך-שעה = תצפית אחת
+            key = observation_key(obs.get('sciName'), obs.get('locId'), obs.get('obsDt'))
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            obs['obsKey'] = key
+            self.pending.append(obs)
+            self.row_count += 1
+            
+            loc = self.hotspots.setdefault(obs['locId'], {
+                'name': obs.get('locName'), 'distance': obs.get('distance'),
+                'species': set(), 'latest_obs': '',
+            })
+            loc['species'].add(obs.get('sciName'))
+            loc['latest_obs'] = max(loc['latest_obs'], str(obs.get('obsDt', '')))
+            name = obs.get('comName') or obs.get('sciName')
+            self.species[name] = self.species.get(name, 0) + 1
+
+    def _flush(self):
+        """נרמול התצפיות הממתינות למסגרת עמודתית ושחרור ה-dicts הגולמיים"""
+        if not self.pending:
+            return
+        with self._stage("normalize"):
+            chunk = normalize_observations(self.pending)
+            self.pending = []
+        with self._stage("distance"):
+            add_distances(chunk, self.lat, self.lon)
+        self.chunks.append(chunk)
+
+    def top_hotspots(self, n=10):
+        ranked = sorted(self.hotspots.values(), key=lambda h: len(h['species']), reverse=True)[:n]
+        return pd.DataFrame([
+            {'name': h['name'], 'species': len(h['species']), 'latest_obs': h['latest_obs']} for h in ranked
+        ])
+
+    def top_species(self, n=10):
+        ranked = sorted(self.species.items(), key=lambda item: item[1], reverse=True)[:n]
+        return pd.DataFrame(ranked, columns=['species', 'observations'])
+
+    def to_result(self, errors=None, partial=False, coverage=None, metrics=None):
+        """בניית ScanResult מלא ממה שהצטבר עד כה (metrics - מדידת שלבי העיבוד)"""
+        self.metrics = metrics = metrics or self.metrics
+        self._flush()
+        with self._stage("normalize"):
+            # המפתחות כבר ייחודיים (seen) - אין צורך בהסרת כפילויות נוספת
+            df = concat_observations(self.chunks)
+        params = dict(self.params, scanned_at=datetime.now().isoformat(timespec="seconds"),
+                      partial=partial, coverage=coverage or {})
+        return ScanResult(df, self.duplicates, list(errors or []), params, metrics)
+
+def empty_observations():
+    return pd.DataFrame({col: pd.Series(dtype='string' if dtype == 'category' else dtype).astype(dtype)
+                         for col, dtype in OBSERVATION_SCHEMA.items()})
+
+def normalize_observations(data, lat=None, lon=None):
+    """שלב הנרמול היחיד: תצפיות גולמיות (רשימת dicts מה-API) או מסגרת קיימת (תמונת מצב
+    ישנה) לסכמה הקבועה OBSERVATION_SCHEMA. מרחקים חסרים מחושבים אם ניתן מרכז (lat, lon)"""
+    if isinstance(data, pd.DataFrame):
+        df = data.copy()
+    else:
+        raw_columns = [col for col in OBSERVATION_SCHEMA if col != 'count'] + ['howMany']
+        df = pd.DataFrame.from_records(data, columns=raw_columns)
+    if df.empty:
+        return empty_observations()
+    
+    if 'count' not in df.columns:
+        how_many = df['howMany'] if 'howMany' in df.columns else pd.Series(np.nan, index=df.index)
+        df['count'] = np.trunc(pd.to_numeric(how_many, errors='coerce'))
+    if 'obsKey' not in df.columns or df['obsKey'].isna().any():
+        obs_dt = df['obsDt'].dt.strftime("%Y-%m-%d %H:%M") if is_datetime64_any_dtype(df['obsDt']) else df['obsDt']
+        df['obsKey'] = [observation_key(*key) for key in zip(df['sciName'], df['locId'], obs_dt)]
+    if lat is not None and lon is not None:
+        add_distances(df, lat, lon)
+    
+    columns = {}
+    for col, dtype in OBSERVATION_SCHEMA.items():
+        values = df[col] if col in df.columns else pd.Series(pd.NA, index=df.index)
+        if dtype == 'datetime64[ns]':
+            values = pd.to_datetime(values, errors='coerce')
+        elif dtype in ('float32', 'Int32'):
+            values = pd.to_numeric(values, errors='coerce')
+        elif dtype == 'category':
+            # קטגוריות מטיפוס string גם בעמודה ריקה כולה - union_categoricals דורש טיפוס זהה
+            values = values.astype('string')
+        columns[col] = values.astype(dtype)
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+def concat_observations(frames):
+    """שרשור מסגרות מנורמלות; הקטגוריות מאוחדות כדי שהעמודות יישארו קטגוריאליות"""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return empty_observations()
+    if len(frames) == 1:
+        return frames[0]
+    merged = pd.concat([frame.drop(columns=CATEGORICAL_COLUMNS) for frame in frames], ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        merged[col] = union_categoricals([frame[col] for frame in frames])
+    return merged[list(OBSERVATION_SCHEMA)]
+
+def build_species_stats(df):
+    """תצפיות וסה"כ פרטים לכל המינים באגרגציה אחת (X או ריק = לפחות פרט אחד)"""
+    name_col = 'comName' if 'comName' in df.columns else 'sciName'
+    if df.empty:
+        return pd.DataFrame(columns=['observations', 'individuals'])
+    stats = df.assign(individuals=df['count'].fillna(1)).groupby(name_col, sort=False, observed=True).agg(
+        observations=(name_col, 'size'),
+        individuals=('individuals', 'sum'),
+    )
+    stats['individuals'] = stats['individuals'].astype(int)
+    return stats.sort_values(['observations', 'individuals'], ascending=False, kind='stable')
+
+def build_hotspot_index(df):
+    """אינדקס מצטבר לכל מוקד, נבנה פעם אחת בסוף הסריקה ב-groupby יחיד"""
+    columns = ['name', 'lat', 'lng', 'distance', 'species', 'checklists', 'latest_obs']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    index = df.groupby('locId', sort=False, observed=True).agg(
+        name=('locName', 'first'),
+        lat=('lat', 'first'),
+        lng=('lng', 'first'),
+        distance=('distance', 'first'),
+        species=('sciName', 'nunique'),
+        checklists=('subId', 'nunique'),
+        latest_obs=('obsDt', 'max'),
+    )
+    return index.sort_values('species', ascending=False, kind='stable')[columns]
+
+def build_species_positions(df):
+    """אינדקס מין → מיקומי השורות, ברמת המין (שתי המילים הראשונות של sciName),
+    כך שתתי-מינים נכללים וחיפוש מין הוא O(התאמות)"""
+    if df.empty:
+        return {}
+    # המפתח מחושב פעם אחת לכל קטגוריה ולא לכל שורה
+    categories = df['sciName'].cat.categories
+    category_keys = categories.str.lower().str.split().str[:2].str.join(' ')
+    keys = df['sciName'].map(dict(zip(categories, category_keys)))
+    return keys.groupby(keys, observed=True).indices
+
+class ScanResult:
+    """תוצאת סריקה מעובדת: תצפיות, אינדקס מוקדים וסטטיסטיקת מינים"""
+    def __init__(self, df, duplicates_removed=0, errors=None, params=None, metrics=None):
+        self.df = df
+        self.duplicates_removed = duplicates_removed
+        self.errors = errors or []
+        self.params = params or {}
+        self.metrics = metrics
+        self.version = dataset_version(df, self.params)
+        with metrics.stage("aggregation") if metrics else nullcontext():
+            self.hotspot_index = build_hotspot_index(df)
+            self.species_stats = build_species_stats(df)
+            self.species_positions = build_species_positions(df)
+
+    def memory_bytes(self):
+        return int(
+            self.df.memory_usage(deep=True).sum()
+            + self.hotspot_index.memory_usage(deep=True).sum()
+            + self.species_stats.memory_usage(deep=True).sum()
+        )
+
+class _Flight:
+    """סריקה שנמצאת כרגע בביצוע - סשנים נוספים ממתינים לה"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class SharedResultStore:
+    """מאגר תוצאות משותף לכל הסשנים בתהליך: סריקות זהות מתאחדות (singleflight),
+    והתוצאות נשמרות ב-LRU מוגבל במספר ובזיכרון. הסשנים מחזיקים הפניה לאותו אובייקט"""
+    def __init__(self, max_entries=STORE_MAX_ENTRIES, max_bytes=STORE_MAX_BYTES, max_age=STORE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries = OrderedDict()   # key -> (result, size, stored_at)
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(lat, lon, radius, days, *extra):
+        return (round(lat, STORE_COORD_PRECISION), round(lon, STORE_COORD_PRECISION), radius, days) + extra
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > self.max_age:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def status(self, key):
+        """'cached' / 'inflight' / None - לצורך הודעות ב-UI"""
+        with self.lock:
+            if self._lookup(key) is not None:
+                return "cached"
+            return "inflight" if key in self.inflight else None
+
+    def get_or_compute(self, key, compute):
+        """מחזיר תוצאה שמורה, ממתין לסריקה זהה שבביצוע, או מריץ את compute בעצמו"""
+        while True:
+            with self.lock:
+                result = self._lookup(key)
+                if result is not None:
+                    return result
+                flight = self.inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self.inflight[key] = _Flight()
+            if leader:
+                break
+            flight.done.wait()
+            if flight.result is not None:
+                return flight.result
+            # הסריקה המובילה נכשלה או בוטלה - ננסה להוביל בעצמנו
+
+        try:
+            flight.result = compute()
+            if not flight.result.df.empty:
+                self._put(key, flight.result)
+            return flight.result
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            flight.done.set()
+
+    def _put(self, key, result):
+        size = result.memory_bytes()
+        with self.lock:
+            self.entries[key] = (result, size, time.time())
+            self.entries.move_to_end(key)
+            total = sum(entry[1] for entry in self.entries.values())
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or total > self.max_bytes):
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                total -= evicted_size
+
+def save_snapshot(result, path, fmt="parquet"):
+    """שמירת תמונת מצב עמודתית (Parquet/Feather) עם עמודות קטגוריאליות"""
+    df = result.df.reset_index(drop=True)
+    if fmt == "feather":
+        df.to_feather(path)
+    else:
+        df.to_parquet(path, index=False)
+
+def load_snapshot(path, meta=None):
+    """טעינת תמונת מצב שנשמרה ב-save_snapshot"""
+    meta = meta or {}
+    df = pd.read_feather(path) if path.endswith(".feather") else pd.read_parquet(path)
+    df = normalize_observations(df)   # תמונות מצב מגרסאות קודמות עוברות לסכמה הנוכחית
+    return ScanResult(df, meta.get("duplicates_removed", 0), meta.get("errors"), meta)
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    """רשימת תמונות המצב בתיקייה (ריקה אם אין)"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(entries, directory=SNAPSHOT_DIR):
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+_export_lock = threading.Lock()
+
+def export_metrics(metrics, totals=None, jsonl_path=METRICS_JSONL_PATH, prom_path=METRICS_PROM_PATH, **labels):
+    """ייצוא מדדי סריקה: הוספה ליומן ה-JSONL, וכתיבה אטומית של המדדים המצטברים (totals)
+    בפורמט Prometheus. נתיב ריק = ללא ייצוא"""
+    with _export_lock:
+        if jsonl_path:
+            with open(jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(metrics.to_jsonl(**labels))
+        if prom_path and totals is not None:
+            tmp_path = f"{prom_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(totals.to_prometheus())
+            os.replace(tmp_path, prom_path)
@@ -0,0 +1,71 @@
+"""מאגר יישובים מקומי (localities.json) וגיאוקוד עם מטמון מתמשך - ללא תלות ב-Streamlit"""
+import difflib
+import json
+import os
+
+from geopy.geocoders import Nominatim
+
+from ebird_engine import TokenBucket
+from species_catalog import normalize
+
+LOCALITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "localities.json")
+GEOCODER_USER_AGENT = "ebird-israel-birding"   # מזהה קבוע, כנדרש במדיניות Nominatim
+GEOCODER_RATE = 1                              # Nominatim מתיר בקשה אחת לשנייה
+GEOCODER_TIMEOUT = 10
+
+class Gazetteer:
+    """יישובי ישראל בעברית ובאנגלית (וכינויים), עם התאמה מדויקת ומקורבת"""
+    def __init__(self, localities):
+        self.localities = localities
+        self.names = {}
+        for place in localities:
+            for name in [place['heb'], place['eng']] + place.get('aliases', []):
+                self.names.setdefault(normalize(name), place)
+
+    @classmethod
+    def from_file(cls, path=LOCALITIES_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, name):
+        """היישוב המתאים לשם, או None. שגיאות כתיב קטנות נסלחות"""
+        key = normalize(name)
+        if not key:
+            return None
+        if key in self.names:
+            return self.names[key]
+        close = difflib.get_close_matches(key, self.names, n=1, cutoff=0.85)
+        return self.names[close[0]] if close else None
+
+class Geocoder:
+    """שם מקום -> קואורדינטות: מאגר מקומי, אחריו מטמון מתמשך, ורק בסוף Nominatim"""
+    def __init__(self, gazetteer=None, cache=None, online=True, user_agent=GEOCODER_USER_AGENT):
+        self.gazetteer = gazetteer or Gazetteer.from_file()
+        self.cache = cache
+        self.online = online
+        self.client = Nominatim(user_agent=user_agent, timeout=GEOCODER_TIMEOUT) if online else None
+        self.rate_limiter = TokenBucket(GEOCODER_RATE)
+
+    def resolve(self, name):
+        """מחזיר {'name', 'lat', 'lon', 'source'} או None אם המקום לא נמצא.
+        שגיאות רשת של Nominatim עולות לקורא ואינן נשמרות במטמון."""
+        place = self.gazetteer.lookup(name)
+        if place:
+            return {"name": place['heb'], "lat": place['lat'], "lon": place['lon'], "source": "gazetteer"}
+
+        query = normalize(name)
+        if not query:
+            return None
+        if self.cache is not None:
+            cached = self.cache.get_geocode(query)
+            if cached is not None:
+                return dict(cached[0], source="cache") if cached else None
+        if not self.online:
+            return None
+
+        self.rate_limiter.acquire()
+        geo = self.client.geocode(f"{name}, Israel")
+        places = [{"name": name, "lat": geo.latitude, "lon": geo.longitude}] if geo else []
+        if self.cache is not None:
+            self.cache.put_geocode(query, places)
+        return dict(places[0], source="nominatim") if places else None
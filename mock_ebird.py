@@ -0,0 +1,330 @@
+"""שרת eBird מדומה להרצת מדידות ללא מפתח API וללא רשת
+
+מחקה את ה-endpoints שהמנוע משתמש בהם:
+    /ref/hotspot/geo, /ref/hotspot/{region}, /data/obs/{locId}/recent, /data/obs/geo/recent,
+    /data/obs/{region}/historic/{y}/{m}/{d}
+ומזריק השהיה, תשובות 429/503 ובקשות שנתקעות (timeout) לפי הגדרה.
+הנתונים סינתטיים (seed קבוע) או מוקלטים מה-API האמיתי לקובץ JSON.
+
+שימוש עצמאי (למשל מול האפליקציה עם EBIRD_API_URL=http://127.0.0.1:8765/v2):
+    python mock_ebird.py --hotspots 300 --latency 0.05 --error-rate 0.05
+    python mock_ebird.py --record recording.json --api-key KEY --lat 32.175 --lon 34.906
+    python mock_ebird.py --dataset recording.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from ebird_engine import eBirdEngine, haversine, MAX_BACK_DAYS
+
+DEFAULT_CENTER = (32.175, 34.906)      # כפר סבא
+DEFAULT_SEED = 1
+DT_FORMAT = "%Y-%m-%d %H:%M"
+
+def synthetic_dataset(hotspots=150, species_per_hotspot=40, species_pool=400, area_km=50,
+                      center=DEFAULT_CENTER, inactive_share=0.15, seed=DEFAULT_SEED):
+    """מוקדים ותצפיות אקראיים אך משוחזרים (seed). התאריכים יחסיים להיום"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(second=0, microsecond=0)
+    pool = [(f"Genus{i // 4} species{i}", f"Bird {i}", f"sp{i:04d}") for i in range(species_pool)]
+    lat0, lon0 = center
+    result = {"hotspots": [], "observations": {}}
+    for i in range(hotspots):
+        # פיזור אחיד בתוך עיגול ברדיוס area_km
+        r, angle = area_km * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        lat = lat0 + r * math.sin(angle) / 111.0
+        lon = lon0 + r * math.cos(angle) / (111.0 * math.cos(math.radians(lat0)))
+        loc_id = f"L{100000 + i}"
+        inactive = rng.random() < inactive_share
+        observations = []
+        if not inactive:
+            count = max(1, min(species_pool, int(rng.gauss(species_per_hotspot, species_per_hotspot / 3))))
+            for sci, com, code in rng.sample(pool, count):
+                if rng.random() < 0.05:
+                    sci = f"{sci} ssp{rng.randint(1, 3)}"
+                observed = now - timedelta(days=rng.uniform(0, MAX_BACK_DAYS), hours=rng.uniform(0, 12))
+                observations.append({
+                    "speciesCode": code, "comName": com, "sciName": sci, "locId": loc_id,
+                    "locName": f"Hotspot {i}", "obsDt": observed.strftime(DT_FORMAT),
+                    "howMany": rng.choice([1, 1, 2, 3, 5, 12, None]), "lat": round(lat, 5), "lng": round(lon, 5),
+                    "obsValid": True, "obsReviewed": False, "locationPrivate": False,
+                    "subId": f"S{rng.randint(1, 10 ** 8)}",
+                })
+        latest = max((obs["obsDt"] for obs in observations), default=(now - timedelta(days=90)).strftime(DT_FORMAT))
+        result["hotspots"].append({
+            "locId": loc_id, "locName": f"Hotspot {i}", "countryCode": "IL", "subnational1Code": "IL-M",
+            "lat": round(lat, 5), "lng": round(lon, 5), "latestObsDt": latest,
+            "numSpeciesAllTime": len(observations) + rng.randint(0, 200),
+        })
+        result["observations"][loc_id] = observations
+    return result
+
+def record_dataset(api_key, lat, lon, dist, days, path, limit=None):
+    """הקלטת תשובות אמיתיות מה-API לקובץ, לשחזור מאוחר יותר בשרת המדומה"""
+    engine = eBirdEngine(api_key)
+    hotspots = engine.get_hotspots_in_region(lat, lon, dist)[:limit]
+    observations = {}
+    for hotspot in hotspots:
+        try:
+            observations[hotspot['locId']] = engine.get_species_list_for_location(hotspot['locId'], days)
+        except Exception:
+            observations[hotspot['locId']] = []
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"hotspots": hotspots, "observations": observations, "recorded_at": datetime.now().strftime(DT_FORMAT)},
+                  f, ensure_ascii=False)
+
+def load_dataset(path):
+    """טעינת הקלטה, עם הזזת כל התאריכים כך שההקלטה "מתרחשת" היום"""
+    with open(path, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+    recorded_at = dataset.get("recorded_at")
+    if recorded_at:
+        shift = datetime.now() - datetime.strptime(recorded_at, DT_FORMAT)
+        def moved(value):
+            try:
+                return (datetime.strptime(value[:16], DT_FORMAT) + shift).strftime(DT_FORMAT)
+            except (TypeError, ValueError):
+                return value
+        for hotspot in dataset["hotspots"]:
+            if hotspot.get("latestObsDt"):
+                hotspot["latestObsDt"] = moved(hotspot["latestObsDt"])
+        for observations in dataset["observations"].values():
+            for obs in observations:
+                obs["obsDt"] = moved(obs["obsDt"])
+    return dataset
+
+class Faults:
+    """הגדרת התקלות המוזרקות. כל השיעורים הם הסתברויות לבקשה"""
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, server_error_rate=0.0,
+                 timeout_rate=0.0, hang=30.0, retry_after=1, seed=DEFAULT_SEED):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.retry_after = retry_after
+        self.seed = seed
+
+class MockEBirdHandler(BaseHTTPRequestHandler):
+    dataset = None
+    faults = Faults()
+    rng = random.Random(DEFAULT_SEED)
+    lock = threading.Lock()
+    stats = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        cls = type(self)
+        if url.path == "/__stats":
+            with cls.lock:
+                return self._send(200, dict(cls.stats))
+        if url.path == "/__reset":
+            with cls.lock:
+                cls.stats.clear()
+            return self._send(200, {})
+
+        route, body = self.route(url.path, query)
+        faults = cls.faults
+        with cls.lock:
+            roll = cls.rng.random()
+            delay = faults.latency + cls.rng.uniform(0, faults.jitter)
+            cls.stats["requests"] += 1
+            cls.stats[f"route:{route}"] += 1
+            if body is not None and roll < faults.timeout_rate:
+                outcome = "timeout"
+            elif body is not None and roll < faults.timeout_rate + faults.error_rate:
+                outcome = "429"
+            elif body is not None and roll < faults.timeout_rate + faults.error_rate + faults.server_error_rate:
+                outcome = "503"
+            else:
+                outcome = "200" if body is not None else "404"
+            cls.stats[f"status:{outcome}"] += 1
+            if outcome == "200":
+                cls.stats["rows"] += len(body)
+
+        if outcome == "timeout":
+            time.sleep(faults.hang)
+            try:
+                return self._send(504)
+            except (BrokenPipeError, ConnectionResetError):
+                return None   # הלקוח כבר ויתר
+        time.sleep(delay)
+        if outcome == "429":
+            return self._send(429, headers={"Retry-After": str(faults.retry_after)})
+        if outcome == "503":
+            return self._send(503)
+        if outcome == "404":
+            return self._send(404, {"errors": [{"title": "Not Found"}]})
+        sent = self._send(200, body)
+        with cls.lock:
+            cls.stats["bytes"] += sent
+
+    def route(self, path, query):
+        """(שם ה-route, גוף התשובה) - גוף None משמעו 404"""
+        dataset = type(self).dataset
+        path = re.sub(r"^/v2", "", path)
+        back = int(query.get("back", 14))
+        cutoff = (datetime.now() - timedelta(days=back)).strftime(DT_FORMAT)
+
+        if path == "/ref/hotspot/geo":
+            lat, lon, dist = float(query["lat"]), float(query["lng"]), float(query.get("dist", 25))
+            return "hotspot_geo", [h for h in dataset["hotspots"]
+                                   if haversine(lat, lon, h["lat"], h["lng"]) <= dist]
+        if path.startswith("/ref/hotspot/"):
+            region = path.rsplit("/", 1)[-1]
+            return "hotspot_region", [h for h in dataset["hotspots"]
+                                      if region in (h.get("countryCode"), h.get("subnational1Code"))]
+        if path.startswith("/data/obs/geo/recent"):
+            # כמו eBird: התצפית האחרונה של כל מין באזור, עד maxResults
+            lat, lon, dist = float(query["lat"]), float(query["lng"]), float(query.get("dist", 25))
+            latest = {}
+            for hotspot in dataset["hotspots"]:
+                if haversine(lat, lon, hotspot["lat"], hotspot["lng"]) > dist:
+                    continue
+                for obs in dataset["observations"].get(hotspot["locId"], []):
+                    if obs["obsDt"] >= cutoff and obs["obsDt"] > latest.get(obs["sciName"], {}).get("obsDt", ""):
+                        latest[obs["sciName"]] = obs
+            rows = sorted(latest.values(), key=lambda obs: obs["obsDt"], reverse=True)
+            return "obs_geo", rows[:int(query.get("maxResults", 10000))]
+        match = re.fullmatch(r"/data/obs/([^/]+)/historic/(\d+)/(\d+)/(\d+)", path)
+        if match:
+            # כמו eBird (rank=mrec): התצפית האחרונה של כל מין באותו יום, בכל האזור (IL, IL-M)
+            # או במוקד אחד - כך שקוד אזור מחזיר שורה אחת למין ולא כל תצפית
+            code = match.group(1)
+            day = "%04d-%02d-%02d" % tuple(int(part) for part in match.groups()[1:])
+            locations = [code] if code in dataset["observations"] else list(dataset["observations"])
+            latest = {}
+            for loc_id in locations:
+                for obs in dataset["observations"].get(loc_id, []):
+                    if obs["obsDt"][:10] == day and obs["obsDt"] > latest.get(obs["sciName"], {}).get("obsDt", ""):
+                        latest[obs["sciName"]] = obs
+            return "obs_historic", [dict(obs) for obs in sorted(latest.values(), key=lambda obs: obs["obsDt"], reverse=True)]
+        match = re.fullmatch(r"/data/obs/([^/]+)/recent", path)
+        if match:
+            observations = dataset["observations"].get(match.group(1))
+            if observations is None:
+                return "obs_location", None
+            return "obs_location", [dict(obs) for obs in observations if obs["obsDt"] >= cutoff]
+        return "unknown", None
+
+def serve(dataset, faults, host="127.0.0.1", port=8765, ready=None):
+    """הרצת השרת בתהליך הנוכחי; ready (Queue) מקבל את הפורט בפועל"""
+    MockEBirdHandler.dataset = dataset
+    MockEBirdHandler.faults = faults
+    MockEBirdHandler.rng = random.Random(faults.seed)
+    server = ThreadingHTTPServer((host, port), MockEBirdHandler)
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+class MockEBirdServer:
+    """השרת המדומה בתהליך נפרד, כדי שלא יתחרה במנוע על ה-GIL ועל מדידת הזיכרון"""
+    def __init__(self, dataset, faults=None, host="127.0.0.1", port=0):
+        self.dataset = dataset
+        self.faults = faults or Faults()
+        self.host = host
+        self.port = port
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v2"
+
+    def start(self):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=serve, args=(self.dataset, self.faults, self.host, self.port, ready), daemon=True
+        )
+        self.process.start()
+        self.port = ready.get(timeout=30)
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def _admin(self, path):
+        return requests.get(f"http://{self.host}:{self.port}{path}", timeout=5).json()
+
+    def stats(self):
+        return self._admin("/__stats")
+
+    def reset(self):
+        self._admin("/__reset")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="שרת eBird מדומה")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dataset", help="קובץ הקלטה לשחזור (ברירת מחדל: נתונים סינתטיים)")
+    parser.add_argument("--hotspots", type=int, default=150, help="מספר מוקדים סינתטיים")
+    parser.add_argument("--species", type=int, default=40, help="ממוצע מינים למוקד")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--latency", type=float, default=0.05, help="השהיה בסיסית לבקשה (שניות)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="תוספת השהיה אקראית מקסימלית")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="שיעור תשובות 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="שיעור תשובות 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="שיעור בקשות שנתקעות")
+    parser.add_argument("--hang", type=float, default=30.0, help="משך התקיעה (שניות)")
+    parser.add_argument("--record", metavar="PATH", help="הקלטה מה-API האמיתי לקובץ במקום הרצת שרת")
+    parser.add_argument("--api-key", help="מפתח eBird להקלטה")
+    parser.add_argument("--lat", type=float, default=DEFAULT_CENTER[0])
+    parser.add_argument("--lon", type=float, default=DEFAULT_CENTER[1])
+    parser.add_argument("--radius", type=int, default=25)
+    parser.add_argument("--days", type=int, default=MAX_BACK_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.record:
+        if not args.api_key:
+            parser.error("הקלטה דורשת --api-key")
+        record_dataset(args.api_key, args.lat, args.lon, args.radius, args.days, args.record)
+        return 0
+
+    dataset = load_dataset(args.dataset) if args.dataset else synthetic_dataset(
+        args.hotspots, args.species, seed=args.seed)
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.server_error_rate,
+                    args.timeout_rate, args.hang, seed=args.seed)
+    print(f"Serving {len(dataset['hotspots'])} hotspots on http://127.0.0.1:{args.port}/v2")
+    try:
+        serve(dataset, faults, port=args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
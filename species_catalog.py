@@ -0,0 +1,106 @@
+"""קטלוג הציפורים (birds.json) ואינדקס חיפוש רב-לשוני - ללא תלות ב-Streamlit"""
+from bisect import bisect_left
+import difflib
+import json
+import os
+import re
+
+# רשימת נתיבים אפשריים
+BIRDS_PATHS = [
+    "/mnt/user-data/uploads/birds.json",
+    "./birds.json",
+    "birds.json",
+    "/home/claude/birds.json",
+]
+UPLOAD_DIR = "/mnt/user-data/uploads"
+
+# רשימה בסיסית כברירת מחדל
+DEFAULT_BIRDS = [
+    {"heb": "דרור הבית", "eng": "House Sparrow", "sci": "Passer domesticus"},
+    {"heb": "בולבול", "eng": "Common Bulbul", "sci": "Pycnonotus barbatus"},
+    {"heb": "עורב מצוי", "eng": "Hooded Crow", "sci": "Corvus cornix"},
+]
+
+def find_birds_file():
+    """הנתיב הראשון שבו קיים קובץ ציפורים, או None"""
+    for path in BIRDS_PATHS:
+        if os.path.exists(path):
+            return path
+
+    # חיפוש כללי של JSON באזור uploads
+    if os.path.exists(UPLOAD_DIR):
+        json_files = [f for f in os.listdir(UPLOAD_DIR) if f.endswith('.json')]
+        if json_files:
+            return os.path.join(UPLOAD_DIR, json_files[0])
+    return None
+
+def normalize(text):
+    """אותיות קטנות, ללא מקפים/סימנים ועם רווח יחיד - לצורך חיפוש"""
+    return re.sub(r"[\W_]+", " ", str(text).lower()).strip()
+
+def species_key(sci_name):
+    """מפתח ברמת המין: שתי המילים הראשונות של השם המדעי (בלי תת-מין)"""
+    return " ".join(str(sci_name).lower().split()[:2])
+
+class SpeciesCatalog:
+    """רשימת הציפורים עם אינדקס קידומות (עברית, אנגלית ושם מדעי) וחיפוש מקורב"""
+    def __init__(self, birds, source=None, error=None):
+        self.birds = birds
+        self.source = source
+        self.error = error
+
+        # יצירת מפת ציפורות
+        self.bird_map = {}
+        for bird in birds:
+            key = f"{bird.get('heb', 'Unknown')} ({bird.get('eng', 'Unknown')})"
+            self.bird_map[key] = bird.get('sci', '')
+        self.labels = sorted(self.bird_map)
+
+        # אינדקס קידומות: כל שם מלא וכל מילה בו ממופים לתווית, ממוינים לחיפוש בינארי
+        entries = set()
+        for label in self.labels:
+            bird_names = label, self.bird_map[label]
+            for name in bird_names:
+                name = normalize(name)
+                entries.add((name, label))
+                entries.update((word, label) for word in name.split())
+        self.terms = sorted(entries)
+        self.term_keys = [term for term, _ in self.terms]
+
+    @classmethod
+    def from_file(cls, path):
+        """טעינה מקובץ; בכשל או בהיעדר קובץ - רשימת ברירת המחדל עם הודעת שגיאה"""
+        if path is None:
+            return cls(DEFAULT_BIRDS, error="❌ לא נמצא קובץ birds.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f), source=path)
+        except Exception as e:
+            return cls(DEFAULT_BIRDS, error=f"שגיאה בקריאת {path}: {e}")
+
+    def search(self, query, limit=30):
+        """תוויות שמתאימות לשאילתה: קודם התאמת קידומת, ואם אין - התאמה מקורבת"""
+        query = normalize(query)
+        if not query:
+            return self.labels
+        found = []
+        position = bisect_left(self.term_keys, query)
+        while position < len(self.terms) and self.term_keys[position].startswith(query):
+            label = self.terms[position][1]
+            if label not in found:
+                found.append(label)
+            position += 1
+        if not found:
+            close = difflib.get_close_matches(query, self.term_keys, n=limit, cutoff=0.6)
+            for term in close:
+                for label in self.labels_for_term(term):
+                    if label not in found:
+                        found.append(label)
+        return sorted(found)[:limit]
+
+    def labels_for_term(self, term):
+        """כל התוויות שמונח מדויק זה מופיע בשמותיהן"""
+        start = bisect_left(self.term_keys, term)
+        while start < len(self.terms) and self.term_keys[start] == term:
+            yield self.terms[start][1]
+            start += 1
@@ -0,0 +1,102 @@
+"""ארכיון התצפיות: הוספה חוזרת לא משכפלת, הסיכומים היומיים תואמים לשורות, ושאילתות רדיוס
+זהות לסינון haversine ישיר על התצפיות"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import ObservationArchive
+from ebird_engine import haversine, normalize_observations
+
+CENTER = (31.78, 35.21)
+START = date(2026, 10, 1)
+
+def observations(seed=7, n_hotspots=40, n_species=25, n_days=10):
+    rng = random.Random(seed)
+    hotspots = [(f"L{i}", CENTER[0] + rng.uniform(-0.4, 0.4), CENTER[1] + rng.uniform(-0.4, 0.4))
+                for i in range(n_hotspots)]
+    rows = {}
+    for _ in range(3000):
+        loc_id, lat, lng = rng.choice(hotspots)
+        species = rng.randrange(n_species)
+        day = START + timedelta(days=rng.randrange(n_days))
+        obs_dt = f"{day} {rng.randrange(5, 19):02d}:00"
+        rows[(species, loc_id, obs_dt)] = {
+            "sciName": f"Species {species}", "comName": f"Bird {species}", "locId": loc_id,
+            "locName": f"Spot {loc_id}", "lat": lat, "lng": lng, "obsDt": obs_dt,
+            "howMany": rng.choice([None, 1, 2, 5]),
+        }
+    return normalize_observations(list(rows.values()))
+
+def in_radius(df, radius, start, end):
+    """הסינון הישיר: אותן קואורדינטות שהארכיון שומר (מעוגלות ל-5 ספרות)"""
+    lat = df['lat'].astype(float).round(5).to_numpy()
+    lng = df['lng'].astype(float).round(5).to_numpy()
+    day = df['obsDt'].dt.date
+    return df[(haversine(*CENTER, lat, lng) <= radius) & (day >= start) & (day <= end)]
+
+def test_append_is_idempotent(tmp_path):
+    archive = ObservationArchive(str(tmp_path / "archive.sqlite"))
+    df = observations()
+    assert archive.append(df) == len(df)
+    assert archive.append(df) == 0
+    assert archive.stats()["rows"] == len(df)
+
+def test_rollups_match_raw_rows(tmp_path):
+    archive = ObservationArchive(str(tmp_path / "archive.sqlite"))
+    df = observations()
+    # שתי אצוות חופפות - הסיכומים מחושבים מחדש רק למחיצות שהשתנו
+    archive.append(df.iloc[:2000])
+    archive.append(df.iloc[1500:])
+    individuals = int(df['count'].fillna(1).sum())
+    for table in ("daily_species", "daily_hotspot"):
+        totals = archive.conn.execute(f"SELECT SUM(observations), SUM(individuals) FROM {table}").fetchone()
+        assert totals == (len(df), individuals)
+
+def test_radius_queries_match_haversine_filter(tmp_path):
+    archive = ObservationArchive(str(tmp_path / "archive.sqlite"))
+    df = observations()
+    archive.append(df)
+    radius, start, end = 25, START + timedelta(days=2), START + timedelta(days=8)
+    expected = in_radius(df, radius, start, end).assign(individuals=lambda d: d['count'].fillna(1))
+
+    ranking = archive.species_ranking(*CENTER, radius, start, end)
+    by_species = expected.groupby(expected['comName'].astype(str)).agg(
+        observations=('obsKey', 'size'), individuals=('individuals', 'sum'))
+    assert ranking.sort_index().to_dict() == by_species.astype(int).sort_index().to_dict()
+
+    daily = archive.daily_counts(*CENTER, radius, start, end)
+    by_day = expected.groupby(expected['obsDt'].dt.normalize())['obsKey'].size()
+    assert daily['observations'].to_dict() == by_day.to_dict()
+
+class HistoricEngine:
+    max_workers = 2
+
+    def __init__(self):
+        self.calls = []
+
+    def get_historic_observations(self, loc_id, day):
+        self.calls.append((loc_id, day))
+        return [{"sciName": "Species 0", "comName": "Bird 0", "obsDt": f"{day} 07:00", "howMany": 1}]
+
+def test_backfill_skips_logged_days(tmp_path):
+    archive = ObservationArchive(str(tmp_path / "archive.sqlite"))
+    end = START + timedelta(days=2)
+    hotspots = [
+        {"locId": "L1", "locName": "Spot 1", "lat": 31.8, "lng": 35.2,
+         "latestObsDt": f"{end + timedelta(days=3)} 09:00"},
+        # לא נצפה בו דבר מאז START - אין מה לשלוף
+        {"locId": "L2", "locName": "Spot 2", "lat": 31.7, "lng": 35.1, "latestObsDt": "2026-09-01 09:00"},
+    ]
+    engine = HistoricEngine()
+    summary = archive.backfill(engine, hotspots, START, end)
+    assert summary == {"requests": 3, "added": 3, "errors": []}
+    assert sorted(engine.calls) == [("L1", START + timedelta(days=i)) for i in range(3)]
+
+    engine.calls.clear()
+    summary = archive.backfill(engine, hotspots, START, end + timedelta(days=1))
+    assert engine.calls == [("L1", end + timedelta(days=1))]
+    assert summary["added"] == 1
+    assert archive.stats()["backfilled_days"] == 4
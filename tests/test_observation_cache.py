@@ -0,0 +1,43 @@
+"""מטמון התצפיות: חלון קצר שמתמזג לתוך רשומה שמורה לא מקצץ את הרשומה"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ebird_engine import ObservationCache
+
+def observation(species, days_ago):
+    obs_dt = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M")
+    return {"sciName": species, "comName": species, "locId": "L1", "obsDt": obs_dt, "howMany": 1}
+
+def age_entry(cache, key, seconds):
+    with cache.lock:
+        cache.conn.execute("UPDATE entries SET fetched_at = fetched_at - ? WHERE key = ?", (seconds, key))
+        cache.conn.commit()
+
+def test_short_window_merge_keeps_long_window(tmp_path):
+    cache = ObservationCache(str(tmp_path / "cache.sqlite"))
+    rows = [observation(f"Species {i}", i) for i in range(30)]
+    cache.merge_observations("L1", None, rows, 30)
+    age_entry(cache, "obs:L1", cache.ttl["observations"] + 60)
+
+    entry, back = cache.lookup_observations("L1", 7)
+    assert back == 1
+    assert len(entry["window"]) == 8
+    merged = cache.merge_observations("L1", entry, [observation("Species 0", 0)], 7)
+    assert len(merged) == 8
+
+    entry, back = cache.lookup_observations("L1", 30)
+    assert back == 0
+    assert len(entry["window"]) == 30
+
+def test_fresh_entry_is_served_without_fetch(tmp_path):
+    cache = ObservationCache(str(tmp_path / "cache.sqlite"))
+    cache.merge_observations("L1", None, [observation("Species 0", 2), observation("Species 1", 20)], 30)
+
+    entry, back = cache.lookup_observations("L1", 7)
+    assert back == 0
+    assert [obs["sciName"] for obs in entry["window"]] == ["Species 0"]
+    assert time.time() - entry["fetched_at"] < cache.ttl["observations"]